@@ -15,6 +15,9 @@ import random
 from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).parent / "utils" / "telemetry"))
+from global_store import record as record_global
+
 try:
     from dotenv import load_dotenv
 
@@ -160,6 +163,8 @@ def log_notification(input_data: dict, project_info: dict):
         with open(log_file, "a") as f:
             f.write(json.dumps(log_entry) + "\n")
 
+        record_global("notifications", log_entry, project_path)
+
     except Exception:
         pass
 
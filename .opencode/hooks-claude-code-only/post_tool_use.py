@@ -9,116 +9,153 @@ Output: Optional logging or notifications
 
 Use this to:
 - Log tool usage for auditing
-- Send notifications on certain events
-- Track metrics
+- Send notifications on failure loops (see utils/telemetry/error_window.py)
+- Track metrics (per-tool counters and latency histograms, see
+  utils/telemetry/tool_metrics.py)
 - Trigger follow-up actions
 """
 
+import time
+
+HOOK_START_NS = time.monotonic_ns()
+
 import json
+import os
+import subprocess
 import sys
 from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).parent / "utils" / "telemetry"))
+from blob_store import capped_text, put_blob, serialized_size, to_bytes
+from error_window import record_outcome
+from event_log import append_event
+from file_ledger import record_change
+from global_store import record as record_global
+from state import get_log_dir
+from tool_metrics import record_hook_overhead, record_tool_call
+from tool_timing import close_mark, elapsed_ms, process_start_ns
+
+# Characters of tool output kept inline in post_tool_use.jsonl
+OUTPUT_LOG_LIMIT = int(os.getenv("OPENCODE_LOG_OUTPUT_LIMIT", "") or 1000)
+
+# Store truncated outputs in full in the content-addressed blob store
+LOG_FULL_OUTPUT = os.getenv("OPENCODE_LOG_FULL_OUTPUT", "").lower() in ("1", "true", "yes")
 
-def log_tool_use(input_data: dict) -> None:
-    """Log tool usage to a file."""
-    log_dir = Path.cwd() / "logs"
-    log_dir.mkdir(parents=True, exist_ok=True)
-    log_path = log_dir / "post_tool_use.json"
 
+def log_tool_use(input_data: dict) -> None:
+    """Append tool usage to logs/post_tool_use.jsonl."""
     try:
-        if log_path.exists():
-            with open(log_path, "r") as f:
-                log_data = json.load(f)
-        else:
-            log_data = []
+        log_dir = get_log_dir()
 
         # Add timestamp
         entry = {**input_data, "timestamp": datetime.now().isoformat()}
 
-        # Truncate large outputs
-        if "tool_output" in entry and len(str(entry.get("tool_output", ""))) > 1000:
-            entry["tool_output"] = str(entry["tool_output"])[:1000] + "... [truncated]"
-
-        log_data.append(entry)
-
-        # Keep only last 500 entries
-        if len(log_data) > 500:
-            log_data = log_data[-500:]
-
-        with open(log_path, "w") as f:
-            json.dump(log_data, f, indent=2)
-    except Exception:
-        pass
+        # Truncate large outputs without serializing them in full
+        if "tool_output" in entry:
+            tool_output = entry["tool_output"]
+            text, truncated = capped_text(tool_output, OUTPUT_LOG_LIMIT)
+            if truncated:
+                entry["tool_output"] = text + "... [truncated]"
+            if LOG_FULL_OUTPUT and truncated:
+                entry["tool_output_blob"] = "sha256:" + put_blob(to_bytes(tool_output), log_dir)
+
+        append_event("post_tool_use", entry, log_dir)
+
+        # Slim copy for the optional fleet-wide store
+        record_global(
+            "tool_use",
+            {
+                "session_id": input_data.get("session_id"),
+                "tool_name": input_data.get("tool_name"),
+                "success": input_data.get("success", True),
+            },
+        )
+    except Exception as e:
+        print(f"Logging error (non-blocking): {e}", file=sys.stderr)
 
 
 def check_for_errors(input_data: dict) -> None:
-    """Check for errors that might need attention."""
+    """Check for failure loops that might need attention."""
     tool_name = input_data.get("tool_name", "")
     success = input_data.get("success", True)
-    tool_output = str(input_data.get("tool_output", ""))
 
-    # Track consecutive failures (could trigger notification)
-    if not success:
-        error_count_file = Path.cwd() / "logs" / ".error_count"
-        try:
-            if error_count_file.exists():
-                count = int(error_count_file.read_text())
-            else:
-                count = 0
-            count += 1
-            error_count_file.write_text(str(count))
-
-            # After 5 consecutive errors, could send notification
-            if count >= 5:
-                # Placeholder for notification logic
-                pass
-        except Exception:
-            pass
-    else:
-        # Reset error count on success
-        error_count_file = Path.cwd() / "logs" / ".error_count"
+    try:
+        reason = record_outcome(input_data.get("session_id", ""), tool_name, success)
+        if reason:
+            notify_error_loop(tool_name, reason)
+    except Exception as e:
+        print(f"Error tracking failed (non-blocking): {e}", file=sys.stderr)
+
+
+def notify_error_loop(tool_name: str, reason: str) -> None:
+    """Hand a failure-loop alert to notification.py without waiting for it."""
+    message = f"{tool_name} error loop detected: {reason}"
+    print(f"WARNING: {message}", file=sys.stderr)
+
+    notification_script = Path(__file__).parent / "notification.py"
+    if not notification_script.exists():
+        return
+
+    payload = json.dumps(
+        {
+            "type": "error_loop",
+            "message": message,
+            "workspace": {"current_dir": str(Path.cwd())},
+        }
+    )
+    for runner in (["uv", "run"], [sys.executable]):
         try:
-            if error_count_file.exists():
-                error_count_file.unlink()
-        except Exception:
-            pass
+            process = subprocess.Popen(
+                runner + [str(notification_script), "--notify"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            process.stdin.write(payload.encode("utf-8"))
+            process.stdin.close()
+            return
+        except FileNotFoundError:
+            continue
+
+
+def track_metrics(input_data: dict, start_ns: int) -> None:
+    """Update the per-tool metrics aggregate and its exports."""
+    try:
+        duration_ms, pre_hook_ms = close_mark(input_data, start_ns)
+        if duration_ms is None:
+            duration_ms = input_data.get("duration_ms")
+        record_tool_call(
+            input_data.get("tool_name", ""),
+            success=input_data.get("success", True),
+            output_bytes=serialized_size(input_data.get("tool_output")),
+            duration_ms=duration_ms,
+            hook_overhead_ms={"pre_tool_use": pre_hook_ms},
+        )
+    except Exception as e:
+        print(f"Metrics error (non-blocking): {e}", file=sys.stderr)
+
+
+def track_hook_overhead(start_ns: int) -> None:
+    """Record this hook's own run time, once all its other work is done."""
+    try:
+        record_hook_overhead("post_tool_use", elapsed_ms(start_ns))
+    except Exception as e:
+        print(f"Metrics error (non-blocking): {e}", file=sys.stderr)
 
 
 def track_file_changes(input_data: dict) -> None:
-    """Track which files were modified."""
-    tool_name = input_data.get("tool_name", "")
-    tool_input = input_data.get("tool_input", {})
-
-    if tool_name in ["Edit", "Write"]:
-        file_path = tool_input.get("file_path", "") or tool_input.get("filePath", "")
-        if file_path:
-            changes_file = Path.cwd() / "logs" / "file_changes.json"
-            try:
-                if changes_file.exists():
-                    changes = json.loads(changes_file.read_text())
-                else:
-                    changes = []
-
-                changes.append(
-                    {
-                        "file": file_path,
-                        "tool": tool_name,
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
-
-                # Keep last 100 changes
-                if len(changes) > 100:
-                    changes = changes[-100:]
-
-                changes_file.write_text(json.dumps(changes, indent=2))
-            except Exception:
-                pass
+    """Record modified files in the change ledger (logs/file_ledger.json)."""
+    try:
+        record_change(input_data)
+    except Exception as e:
+        print(f"File ledger error (non-blocking): {e}", file=sys.stderr)
 
 
 def main():
     try:
+        start_ns = process_start_ns(HOOK_START_NS)
         input_data = json.load(sys.stdin)
 
         # Log the tool use
@@ -127,9 +164,15 @@ def main():
         # Check for errors
         check_for_errors(input_data)
 
+        # Update per-tool metrics
+        track_metrics(input_data, start_ns)
+
         # Track file changes
         track_file_changes(input_data)
 
+        # Last: this hook's overhead, including the writes above
+        track_hook_overhead(start_ns)
+
         sys.exit(0)
 
     except json.JSONDecodeError:
@@ -13,6 +13,9 @@ import sys
 from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).parent / "utils" / "telemetry"))
+from global_store import record as record_global
+
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -91,6 +94,10 @@ def main():
         
         # Log the pre-compact event
         log_pre_compact(input_data)
+        try:
+            record_global("compactions", {"session_id": session_id, "trigger": trigger})
+        except Exception:
+            pass  # Global telemetry is best-effort
         
         # Create backup if requested
         backup_path = None
@@ -10,13 +10,24 @@ Exit codes:
 
 Input (stdin): JSON with tool_name and tool_input
 Output (stderr): Error message if blocking
+
+Allowed calls get a monotonic start mark that post_tool_use.py closes to
+measure tool latency (see utils/telemetry/tool_timing.py).
 """
 
+import time
+
+HOOK_START_NS = time.monotonic_ns()
+
 import json
 import sys
 import re
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent / "utils" / "telemetry"))
+from event_log import append_event
+from tool_timing import elapsed_ms, open_mark, process_start_ns
+
 
 def is_dangerous_rm_command(command: str) -> bool:
     """
@@ -76,28 +87,11 @@ def is_sensitive_file_access(tool_name: str, tool_input: dict) -> tuple[bool, st
 
 
 def log_tool_use(input_data: dict) -> None:
-    """Log tool usage to a file for auditing."""
-    log_dir = Path.cwd() / "logs"
-    log_dir.mkdir(parents=True, exist_ok=True)
-    log_path = log_dir / "pre_tool_use.json"
-
+    """Append tool usage to logs/pre_tool_use.jsonl for auditing."""
     try:
-        if log_path.exists():
-            with open(log_path, "r") as f:
-                log_data = json.load(f)
-        else:
-            log_data = []
-
-        log_data.append(input_data)
-
-        # Keep only last 1000 entries
-        if len(log_data) > 1000:
-            log_data = log_data[-1000:]
-
-        with open(log_path, "w") as f:
-            json.dump(log_data, f, indent=2)
-    except Exception:
-        pass  # Don't fail on logging errors
+        append_event("pre_tool_use", input_data)
+    except Exception as e:
+        print(f"Logging error (non-blocking): {e}", file=sys.stderr)
 
 
 def main():
@@ -124,6 +118,12 @@ def main():
             print(f"BLOCKED: {reason}", file=sys.stderr)
             sys.exit(2)
 
+        # Start the latency clock as late as possible before the tool runs
+        try:
+            open_mark(input_data, hook_ms=elapsed_ms(process_start_ns(HOOK_START_NS)))
+        except Exception as e:
+            print(f"Timing error (non-blocking): {e}", file=sys.stderr)
+
         # Allow the tool execution
         sys.exit(0)
 
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Capped Serialization and Blob Store
+===================================
+Keeps the cost of logging a tool output flat regardless of its size.
+
+``capped_text`` renders at most ``limit`` characters of a value: long strings
+are sliced before encoding and containers are encoded lazily with
+``JSONEncoder.iterencode``, stopping as soon as the prefix is full.
+
+When full outputs are wanted, ``put_blob`` stores them content-addressed
+under ``logs/blobs/<aa>/<sha256>.gz``: gzip-compressed, named by the SHA-256
+of the uncompressed bytes, and written once no matter how often the same
+output recurs.
+
+Usage:
+    python3 blob_store.py SHA256    # Print a stored blob to stdout
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+from state import get_log_dir
+
+BLOB_DIR = "blobs"
+
+
+def _clip(value: Any, budget: list) -> Any:
+    """
+    Copy the part of ``value`` that can fall within a ``budget[0]``-character prefix.
+
+    Every string character and container element encodes to at least one
+    character, so each consumes one unit of the shared budget; nothing past
+    the point where it runs out can appear in the prefix.
+    """
+    if isinstance(value, str):
+        clipped = value[: budget[0] + 1]
+        budget[0] -= len(clipped)
+        return clipped
+    if isinstance(value, dict):
+        result = {}
+        for k, v in value.items():
+            if budget[0] < 0:
+                break
+            budget[0] -= 1
+            result[k] = _clip(v, budget)
+        return result
+    if isinstance(value, (list, tuple)):
+        result = []
+        for v in value:
+            if budget[0] < 0:
+                break
+            budget[0] -= 1
+            result.append(_clip(v, budget))
+        return result
+    budget[0] -= 1
+    return value
+
+
+def capped_text(value: Any, limit: int) -> tuple[str, bool]:
+    """
+    Render a value as text without materializing more than ``limit`` characters.
+
+    Strings are returned as-is (sliced); other values are JSON-encoded.
+
+    Returns:
+        (text of at most ``limit`` characters, whether it was truncated)
+    """
+    if isinstance(value, str):
+        return value[:limit], len(value) > limit
+
+    chunks = []
+    length = 0
+    encoder = json.JSONEncoder(default=str)
+    for chunk in encoder.iterencode(_clip(value, [limit])):
+        chunks.append(chunk)
+        length += len(chunk)
+        if length > limit:
+            return "".join(chunks)[:limit], True
+    return "".join(chunks), False
+
+
+def _text_size(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-8", errors="replace"))
+
+
+def serialized_size(value: Any) -> int:
+    """
+    Return the size in bytes of the content of a value.
+
+    Walks dicts and lists adding the UTF-8 length of every key and leaf
+    instead of encoding the whole value as JSON, so large structured
+    outputs cost one pass over their strings. JSON punctuation and escapes
+    are not counted.
+    """
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if item is None:
+            continue
+        if isinstance(item, str):
+            size += _text_size(item)
+        elif isinstance(item, dict):
+            for key, child in item.items():
+                size += _text_size(key) if isinstance(key, str) else len(str(key))
+                stack.append(child)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        else:
+            size += len(str(item))
+    return size
+
+
+def to_bytes(value: Any) -> bytes:
+    if isinstance(value, str):
+        return value.encode("utf-8", errors="replace")
+    return json.dumps(value, default=str).encode("utf-8")
+
+
+def blob_path(digest: str, log_dir: Optional[Path] = None) -> Path:
+    return (log_dir or get_log_dir()) / BLOB_DIR / digest[:2] / f"{digest}.gz"
+
+
+def put_blob(data: bytes, log_dir: Optional[Path] = None) -> str:
+    """
+    Store ``data`` in the blob store.
+
+    Returns:
+        The SHA-256 hex digest identifying the blob
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest, log_dir)
+    if path.exists():
+        return digest
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{digest}.")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return digest
+
+
+def get_blob(digest: str, log_dir: Optional[Path] = None) -> bytes:
+    with gzip.open(blob_path(digest, log_dir), "rb") as f:
+        return f.read()
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: blob_store.py SHA256", file=sys.stderr)
+        sys.exit(1)
+    digest = sys.argv[1].removeprefix("sha256:")
+    sys.stdout.buffer.write(get_blob(digest))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Sliding-Window Error Tracker
+============================
+Detects agents stuck in failure loops, per session and per tool.
+
+Each (session, tool) pair keeps the outcomes of its last N calls as a bit
+ring packed into one integer, plus a running failure count and the current
+run of consecutive failures. An update shifts one bit in and one bit out,
+so it costs the same whatever the window size. All state lives in
+``logs/.error_window.json`` and is updated under the shared file lock, so
+parallel sessions in one workspace never reset each other.
+
+Thresholds (environment variables):
+    OPENCODE_ERROR_WINDOW             Calls per window (default: 20)
+    OPENCODE_ERROR_RATE_THRESHOLD     Failure rate that triggers an alert (default: 0.5)
+    OPENCODE_ERROR_MIN_CALLS          Calls needed before the rate is trusted (default: 10)
+    OPENCODE_CONSECUTIVE_FAILURES     Consecutive failures that trigger an alert (default: 5)
+
+An alert fires once when a threshold is crossed and re-arms after the
+pair drops back below both thresholds.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+from state import get_log_dir, update_json
+
+STATE_FILE = ".error_window.json"
+
+# Pairs idle for longer than this are dropped to keep the state file small
+IDLE_EXPIRY_SECONDS = 24 * 3600
+
+
+def _env_number(name: str, default, cast=float):
+    try:
+        return cast(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def load_thresholds() -> dict:
+    return {
+        "window": max(1, _env_number("OPENCODE_ERROR_WINDOW", 20, int)),
+        "rate": _env_number("OPENCODE_ERROR_RATE_THRESHOLD", 0.5),
+        "min_calls": max(1, _env_number("OPENCODE_ERROR_MIN_CALLS", 10, int)),
+        "consecutive": max(1, _env_number("OPENCODE_CONSECUTIVE_FAILURES", 5, int)),
+    }
+
+
+def new_entry() -> dict:
+    return {"bits": 0, "calls": 0, "failures": 0, "consecutive": 0, "alerted": False, "updated": 0}
+
+
+def push(entry: dict, failed: bool, window: int) -> None:
+    """Shift one outcome into the window, evicting the oldest if full."""
+    bit = 1 if failed else 0
+    if entry["calls"] >= window:
+        entry["failures"] -= (entry["bits"] >> (window - 1)) & 1
+    else:
+        entry["calls"] += 1
+    entry["bits"] = ((entry["bits"] << 1) | bit) & ((1 << window) - 1)
+    entry["failures"] += bit
+    entry["consecutive"] = entry["consecutive"] + 1 if failed else 0
+
+
+def breach_reason(entry: dict, thresholds: dict) -> Optional[str]:
+    """Describe which threshold the entry currently exceeds, if any."""
+    if entry["consecutive"] >= thresholds["consecutive"]:
+        return f"{entry['consecutive']} consecutive failures"
+    if entry["calls"] >= thresholds["min_calls"]:
+        rate = entry["failures"] / entry["calls"]
+        if rate >= thresholds["rate"]:
+            return f"{entry['failures']} of the last {entry['calls']} calls failed"
+    return None
+
+
+def record_outcome(
+    session_id: str,
+    tool_name: str,
+    success: bool,
+    thresholds: Optional[dict] = None,
+    log_dir: Optional[Path] = None,
+) -> Optional[str]:
+    """
+    Record one tool outcome for a session.
+
+    Returns:
+        A description of the breached threshold when this call newly crosses
+        one, otherwise None
+    """
+    thresholds = thresholds or load_thresholds()
+    key = f"{session_id or 'unknown'}|{tool_name or 'unknown'}"
+    now = int(time.time())
+    alert = None
+
+    def apply(pairs: dict) -> dict:
+        nonlocal alert
+        entry = pairs.get(key) or new_entry()
+        if entry.get("window") != thresholds["window"]:
+            # Window size changed: old bits no longer line up
+            entry = new_entry()
+            entry["window"] = thresholds["window"]
+        push(entry, not success, thresholds["window"])
+        entry["updated"] = now
+
+        reason = breach_reason(entry, thresholds)
+        if reason and not entry["alerted"]:
+            alert = reason
+        entry["alerted"] = reason is not None
+        pairs[key] = entry
+
+        return {k: v for k, v in pairs.items() if now - v.get("updated", 0) < IDLE_EXPIRY_SECONDS}
+
+    update_json((log_dir or get_log_dir()) / STATE_FILE, dict, apply)
+    return alert
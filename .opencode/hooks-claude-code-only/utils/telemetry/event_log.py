@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Append-Only Event Logs
+======================
+Concurrency-safe JSONL logging for hooks that run in parallel.
+
+Each event is one JSON line appended through an ``O_APPEND`` descriptor, so
+concurrent writers never overwrite each other:
+
+- Lines up to ``PIPE_BUF`` bytes go out in a single ``write()``, which the
+  kernel appends atomically without any locking.
+- Longer lines are written under an exclusive ``fcntl`` lock so they cannot
+  interleave with other writers.
+
+Durability is off by default: lines sit in the OS page cache and a crash can
+lose recently appended events. Setting ``OPENCODE_LOG_FSYNC_INTERVAL`` turns
+on group commit, after which ``append_event`` returns only once its line is
+on disk:
+
+- A writer notes the file offset its line ends at and takes the ``.sync``
+  lock next to the log.
+- If the offset recorded there already covers its line, a leader synced it
+  while the writer waited, and it returns without an fsync of its own.
+- Otherwise it leads: it waits the configured interval (0 for none) so more
+  writers can append, fsyncs once, and records the synced offset for the
+  writers queued behind it.
+
+One fsync thus covers every line appended before it, so concurrent hook
+processes share the cost instead of each paying for its own.
+
+Files rotate to ``<name>.1`` once they exceed ``OPENCODE_LOG_MAX_BYTES``
+(default 10 MB).
+
+Usage:
+    python3 event_log.py --stress 32 --events 500    # Sweep 1..32 appending processes
+    python3 event_log.py --stress 32 --events 20 --hooks
+                                                     # Sweep 1..32 post_tool_use.py runners
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+from state import file_lock, get_log_dir, read_json
+
+try:
+    import fcntl
+except ImportError:  # Windows: each writer fsyncs its own line, no group commit
+    fcntl = None
+
+PIPE_BUF = getattr(os, "PIPE_BUF", None) or 4096
+POST_TOOL_USE_HOOK = Path(__file__).resolve().parents[2] / "post_tool_use.py"
+MAX_LOG_BYTES = int(os.getenv("OPENCODE_LOG_MAX_BYTES", "") or 10 * 1024 * 1024)
+
+
+def _fsync_interval() -> Optional[float]:
+    value = os.getenv("OPENCODE_LOG_FSYNC_INTERVAL", "")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def append_event(name: str, entry: dict, log_dir: Optional[Path] = None) -> Path:
+    """
+    Append one event to ``logs/<name>.jsonl``.
+
+    Args:
+        name: Log stream name, e.g. "pre_tool_use"
+        entry: JSON-serializable event
+
+    Returns:
+        Path of the log file written
+    """
+    path = (log_dir or get_log_dir()) / f"{name}.jsonl"
+    line = (json.dumps(entry, default=str) + "\n").encode("utf-8")
+
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        if len(line) <= PIPE_BUF:
+            os.write(fd, line)
+        else:
+            with file_lock(path):
+                view = memoryview(line)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+        _group_commit(fd, path)
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+
+    if size > MAX_LOG_BYTES:
+        _rotate(path)
+    return path
+
+
+def _group_commit(fd: int, path: Path) -> None:
+    """Return once everything written through ``fd`` is on disk, if enabled."""
+    delay = _fsync_interval()
+    if delay is None:
+        return
+    if fcntl is None:
+        os.fsync(fd)
+        return
+
+    # With O_APPEND the descriptor offset is where our line ended
+    end = os.lseek(fd, 0, os.SEEK_CUR)
+    inode = os.fstat(fd).st_ino
+    marker = path.with_name(path.name + ".sync")
+
+    with open(marker, "a+") as marker_file:
+        fcntl.flock(marker_file.fileno(), fcntl.LOCK_EX)
+        try:
+            if _synced_offset(marker_file, inode) >= end:
+                return  # The leader we queued behind synced our line
+            if delay > 0:
+                time.sleep(delay)  # Let more writers join this group
+            synced = os.fstat(fd).st_size
+            os.fsync(fd)
+            marker_file.truncate(0)
+            marker_file.write(f"{inode} {synced}\n")
+            marker_file.flush()
+        finally:
+            fcntl.flock(marker_file.fileno(), fcntl.LOCK_UN)
+
+
+def _synced_offset(marker_file, inode: int) -> int:
+    """Offset the last group commit synced ``inode`` up to (0 if unknown)."""
+    marker_file.seek(0)
+    try:
+        synced_inode, offset = marker_file.read().split()
+        # A rotated log is a new inode whose offsets start again from 0
+        return int(offset) if int(synced_inode) == inode else 0
+    except ValueError:
+        return 0
+
+
+def _rotate(path: Path) -> None:
+    with file_lock(path):
+        try:
+            if path.stat().st_size > MAX_LOG_BYTES:
+                os.replace(path, path.with_name(path.name + ".1"))
+        except FileNotFoundError:
+            pass
+
+
+def read_events(path: Path) -> list[dict]:
+    """Read every complete event from a JSONL log, skipping corrupt lines."""
+    events = []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return events
+
+
+def _stress_worker(log_dir: Path, worker: int, events: int, payload: int) -> None:
+    for i in range(events):
+        append_event("stress", {"worker": worker, "seq": i, "data": "x" * payload}, log_dir)
+
+
+def _hook_worker(work_dir: Path, worker: int, events: int, payload: int) -> None:
+    """Run post_tool_use.py end to end, as Claude Code does for each tool call."""
+    edited = work_dir / f"file-{worker}.txt"
+    for i in range(events):
+        if i % 2:
+            event = {
+                "tool_name": "Edit",
+                "tool_input": {"file_path": str(edited), "old_string": "", "new_string": "x"},
+            }
+        else:
+            event = {"tool_name": "Bash", "tool_input": {"command": "true"}}
+        event.update(
+            session_id=f"stress-{worker}",
+            tool_use_id=f"{worker}-{i}",
+            tool_output="x" * payload,
+            success=True,
+        )
+        subprocess.run(
+            [sys.executable, str(POST_TOOL_USE_HOOK)],
+            input=json.dumps(event).encode("utf-8"),
+            cwd=work_dir,
+            stdout=subprocess.DEVNULL,
+            check=False,
+        )
+
+
+def stress(processes: int, events: int, payload: int, hooks: bool = False) -> tuple[bool, float]:
+    """
+    Hammer one log from many processes and check nothing was lost.
+
+    Args:
+        processes: Concurrent worker processes
+        events: Events per process
+        payload: Payload bytes per event
+        hooks: Run ``post_tool_use.py`` once per event instead of calling
+            ``append_event`` in-process, so its state-file updates count too
+
+    Returns:
+        (whether every event was logged exactly once, events per second)
+    """
+    import multiprocessing
+    import tempfile
+
+    # Rotation would discard events between checks: disable it for the run
+    global MAX_LOG_BYTES
+    MAX_LOG_BYTES = sys.maxsize
+    os.environ["OPENCODE_LOG_MAX_BYTES"] = str(sys.maxsize)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        target = _hook_worker if hooks else _stress_worker
+        workers = [
+            multiprocessing.Process(target=target, args=(work_dir, w, events, payload))
+            for w in range(processes)
+        ]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+
+        expected = processes * events
+        if hooks:
+            logged = read_events(work_dir / "logs" / "post_tool_use.jsonl")
+            seen = {e.get("tool_use_id") for e in logged}
+            metrics = read_json(work_dir / "logs" / ".tool_metrics.json", {}).get("tools", {})
+            counted = sum(stats["calls"] for stats in metrics.values())
+        else:
+            logged = read_events(work_dir / "stress.jsonl")
+            seen = {(e["worker"], e["seq"]) for e in logged}
+            counted = len(seen)
+
+    lost = expected - len(seen)
+    duplicates = len(logged) - len(seen)
+    throughput = expected / elapsed
+    print(
+        f"{processes:>9} {expected:>7} {elapsed:>8.2f}s {throughput:>10,.0f} "
+        f"{lost:>5} {duplicates:>5} {expected - counted:>9}"
+    )
+    return lost == 0 and duplicates == 0 and counted == expected, throughput
+
+
+def sweep(max_processes: int, events: int, payload: int, hooks: bool = False) -> bool:
+    """
+    Run ``stress`` at 1, 2, 4, ... up to ``max_processes`` processes.
+
+    Prints throughput per step and its scaling efficiency relative to one
+    process (1.00 means throughput grew linearly with the process count).
+    """
+    counts = []
+    n = 1
+    while n < max_processes:
+        counts.append(n)
+        n *= 2
+    counts.append(max_processes)
+
+    mode = f"{POST_TOOL_USE_HOOK.name} per event" if hooks else "append_event"
+    print(f"mode={mode} events/process={events} payload={payload}B")
+    print(f"{'processes':>9} {'events':>7} {'elapsed':>9} {'events/s':>10} {'lost':>5} {'dups':>5} {'uncounted':>9}")
+
+    ok = True
+    results = []
+    for n in counts:
+        passed, throughput = stress(n, events, payload, hooks)
+        ok = ok and passed
+        results.append((n, throughput))
+
+    base = results[0][1]
+    print("scaling efficiency: " + "  ".join(f"{n}={t / (n * base):.2f}" for n, t in results))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event log stress test")
+    parser.add_argument("--stress", type=int, default=32, help="Largest number of concurrent processes")
+    parser.add_argument("--events", type=int, default=500, help="Events per process")
+    parser.add_argument("--payload", type=int, default=200, help="Payload bytes per event")
+    parser.add_argument("--hooks", action="store_true", help="Run post_tool_use.py end to end for each event")
+    args = parser.parse_args()
+    sys.exit(0 if sweep(max(1, args.stress), args.events, args.payload, args.hooks) else 1)
+
+
+if __name__ == "__main__":
+    main()
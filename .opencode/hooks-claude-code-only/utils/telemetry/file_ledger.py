@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+File Change Ledger
+==================
+Indexed record of every file the agent has modified.
+
+``logs/file_ledger.json`` maps each absolute file path to its change record
+(first/last modification time, edit count, tools used, sessions, current
+size and cumulative size delta), with a per-session index alongside it.
+Updates touch one path entry and one session entry; lookups are a single
+dict access, so tools such as targeted test runners can ask for exactly the
+changed set without walking the tree. Sessions idle for longer than
+``IDLE_EXPIRY_SECONDS`` are dropped, together with files that only they
+changed, so the ledger stays bounded by recent activity.
+
+Usage:
+    python3 file_ledger.py                    # All changed paths
+    python3 file_ledger.py --session ID       # Paths changed by one session
+    python3 file_ledger.py --json             # Full records as JSON
+    python3 file_ledger.py PATH...            # Records for the given paths
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+from state import get_log_dir, read_json, update_json
+
+LEDGER_FILE = "file_ledger.json"
+
+# Sessions idle for longer than this are dropped to keep the ledger small
+IDLE_EXPIRY_SECONDS = 7 * 24 * 3600
+
+# Tools whose tool_input carries the path of a file they modify
+WRITE_TOOLS = ("Edit", "MultiEdit", "Write")
+
+
+def new_ledger() -> dict:
+    return {"version": 2, "files": {}, "sessions": {}}
+
+
+def _upgrade(ledger: dict, now: int) -> dict:
+    """Convert a version 1 ledger, whose session index had no timestamps."""
+    if ledger.get("version") == 1:
+        ledger["sessions"] = {
+            session_id: {"updated": now, "files": files}
+            for session_id, files in ledger["sessions"].items()
+        }
+        ledger["version"] = 2
+    return ledger
+
+
+def expire_sessions(ledger: dict, now: int) -> None:
+    """Drop idle sessions and the files no remaining session changed."""
+    expired = {
+        session_id
+        for session_id, session in ledger["sessions"].items()
+        if now - session["updated"] >= IDLE_EXPIRY_SECONDS
+    }
+    if not expired:
+        return
+    for session_id in expired:
+        del ledger["sessions"][session_id]
+    for path in list(ledger["files"]):
+        record = ledger["files"][path]
+        record["sessions"] = [s for s in record["sessions"] if s not in expired]
+        if not record["sessions"]:
+            del ledger["files"][path]
+
+
+def changed_path(tool_name: str, tool_input: dict) -> Optional[str]:
+    """Return the absolute path a write tool modified, if any."""
+    if tool_name not in WRITE_TOOLS:
+        return None
+    file_path = tool_input.get("file_path", "") or tool_input.get("filePath", "")
+    if not file_path:
+        return None
+    return os.path.abspath(file_path)
+
+
+def _estimated_delta(tool_name: str, tool_input: dict, size: Optional[int]) -> int:
+    """Size delta for a file seen for the first time, from the tool input."""
+    if tool_name == "Edit":
+        return len(tool_input.get("new_string", "")) - len(tool_input.get("old_string", ""))
+    if tool_name == "MultiEdit":
+        return sum(
+            len(edit.get("new_string", "")) - len(edit.get("old_string", ""))
+            for edit in tool_input.get("edits", [])
+        )
+    # Write of an unseen file: treat it as created
+    return size or 0
+
+
+def record_change(input_data: dict, log_dir: Optional[Path] = None) -> Optional[dict]:
+    """
+    Fold one Edit/Write call into the ledger.
+
+    Returns:
+        The updated record for the changed path, or None if the call did not
+        modify a file
+    """
+    tool_name = input_data.get("tool_name", "")
+    tool_input = input_data.get("tool_input", {}) or {}
+    path = changed_path(tool_name, tool_input)
+    if not path:
+        return None
+
+    session_id = input_data.get("session_id") or "unknown"
+    try:
+        size = os.stat(path).st_size
+    except OSError:
+        size = None
+    now = datetime.now().isoformat()
+    now_epoch = int(time.time())
+
+    def apply(ledger: dict) -> dict:
+        ledger = _upgrade(ledger, now_epoch)
+        record = ledger["files"].get(path)
+        if record is None:
+            delta = _estimated_delta(tool_name, tool_input, size)
+            record = ledger["files"][path] = {
+                "first_modified": now,
+                "last_modified": now,
+                "edits": 0,
+                "tools": {},
+                "sessions": [],
+                "size": None,
+                "size_delta": 0,
+            }
+        else:
+            delta = size - record["size"] if size is not None and record["size"] is not None else 0
+
+        record["last_modified"] = now
+        record["edits"] += 1
+        record["tools"][tool_name] = record["tools"].get(tool_name, 0) + 1
+        if session_id not in record["sessions"]:
+            record["sessions"].append(session_id)
+        record["size"] = size
+        record["size_delta"] += delta
+
+        session = ledger["sessions"].setdefault(session_id, {"updated": now_epoch, "files": {}})
+        session["updated"] = now_epoch
+        session["files"][path] = session["files"].get(path, 0) + 1
+
+        expire_sessions(ledger, now_epoch)
+        return ledger
+
+    ledger = update_json((log_dir or get_log_dir()) / LEDGER_FILE, new_ledger, apply)
+    return ledger["files"][path]
+
+
+def load_ledger(log_dir: Optional[Path] = None) -> dict:
+    ledger = read_json((log_dir or get_log_dir()) / LEDGER_FILE, None) or new_ledger()
+    return _upgrade(ledger, int(time.time()))
+
+
+def changed_files(ledger: dict, session_id: Optional[str] = None) -> list[str]:
+    """Return the changed paths, optionally restricted to one session."""
+    if session_id is not None:
+        return sorted(ledger["sessions"].get(session_id, {}).get("files", {}))
+    return sorted(ledger["files"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the file change ledger")
+    parser.add_argument("paths", nargs="*", help="Show records for these paths")
+    parser.add_argument("--session", help="Only list files changed by this session")
+    parser.add_argument("--json", action="store_true", help="Print full records as JSON")
+    args = parser.parse_args()
+
+    ledger = load_ledger()
+    if args.paths:
+        records = {p: ledger["files"].get(os.path.abspath(p)) for p in args.paths}
+        print(json.dumps(records, indent=2))
+        return
+
+    paths = changed_files(ledger, args.session)
+    if args.json:
+        print(json.dumps({p: ledger["files"][p] for p in paths}, indent=2))
+    else:
+        print("\n".join(paths))
+
+
+if __name__ == "__main__":
+    main()
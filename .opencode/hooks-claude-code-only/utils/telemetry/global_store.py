@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Global Telemetry Store
+======================
+Optional fleet-wide copy of hook telemetry under the user's home directory.
+
+Hooks normally log into each checkout's own ``logs/`` directory. When
+``OPENCODE_GLOBAL_TELEMETRY=1`` (or ``OPENCODE_TELEMETRY_HOME`` is set), they
+also append slim events to a store partitioned by project and day:
+
+    ~/.opencode/telemetry/<project>-<hash>/<YYYY-MM-DD>/<stream>.jsonl
+
+Each project only ever writes inside its own partition directories, so
+projects never contend on a file. Reports build a merged view by scanning
+only the partitions that match the requested projects, days and streams.
+
+Usage:
+    python3 global_store.py                          # Last 7 days, all projects
+    python3 global_store.py --days 30 --project api  # One project, last 30 days
+    python3 global_store.py --json                   # Machine-readable report
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+from event_log import append_event, read_events
+from state import read_json, write_atomic
+
+PROJECT_FILE = "project.json"
+
+
+def store_root() -> Optional[Path]:
+    """Return the global store root, or None if the store is disabled."""
+    home = os.getenv("OPENCODE_TELEMETRY_HOME", "").strip()
+    if home:
+        return Path(home).expanduser()
+    if os.getenv("OPENCODE_GLOBAL_TELEMETRY", "").lower() in ("1", "true", "yes"):
+        return Path.home() / ".opencode" / "telemetry"
+    return None
+
+
+def project_key(project_dir: Path) -> str:
+    """Partition name for a project: readable name plus a path hash."""
+    resolved = str(project_dir.resolve())
+    digest = hashlib.sha1(resolved.encode("utf-8")).hexdigest()[:8]
+    return f"{project_dir.name or 'root'}-{digest}"
+
+
+def record(stream: str, entry: dict, project_dir: Optional[Path] = None) -> Optional[Path]:
+    """
+    Append an event to today's partition of a project, if the store is enabled.
+
+    Args:
+        stream: Event stream, e.g. "tool_use", "notifications", "compactions"
+        entry: Slim JSON-serializable event
+        project_dir: Project root; defaults to the current directory
+
+    Returns:
+        Path of the partition log written, or None if the store is disabled
+    """
+    root = store_root()
+    if root is None:
+        return None
+
+    project_dir = Path(project_dir or Path.cwd())
+    project_root = root / project_key(project_dir)
+    partition = project_root / date.today().isoformat()
+    partition.mkdir(parents=True, exist_ok=True)
+
+    project_file = project_root / PROJECT_FILE
+    if not project_file.exists():
+        write_atomic(project_file, json.dumps({"name": project_dir.name, "path": str(project_dir.resolve())}))
+
+    entry = {"timestamp": datetime.now().isoformat(), **entry}
+    return append_event(stream, entry, partition)
+
+
+def iter_partitions(
+    root: Path, days: int, projects: Optional[list[str]] = None
+) -> Iterator[tuple[str, Path]]:
+    """
+    Yield (project key, partition dir) for matching projects and days.
+
+    Projects are keyed by partition name (``<name>-<hash>``), so two checkouts
+    with the same directory name stay apart. ``projects`` may list either.
+    """
+    wanted_days = {(date.today() - timedelta(days=n)).isoformat() for n in range(days)}
+    for project_root in sorted(p for p in root.iterdir() if p.is_dir()):
+        info = read_json(project_root / PROJECT_FILE, {})
+        name = info.get("name", project_root.name)
+        if projects and name not in projects and project_root.name not in projects:
+            continue
+        for day in sorted(wanted_days):
+            partition = project_root / day
+            if partition.is_dir():
+                yield project_root.name, partition
+
+
+def iter_events(
+    stream: str, days: int = 7, projects: Optional[list[str]] = None
+) -> Iterator[tuple[str, dict]]:
+    """Merged read view: yield (project key, event) across matching partitions."""
+    root = store_root()
+    if root is None or not root.exists():
+        return
+    for name, partition in iter_partitions(root, days, projects):
+        for event in read_events(partition / f"{stream}.jsonl"):
+            yield name, event
+
+
+def build_report(days: int = 7, projects: Optional[list[str]] = None) -> dict:
+    """Summarize tool usage, notifications and compactions per project key."""
+    report: dict = {}
+    root = store_root()
+
+    def project(key: str) -> dict:
+        if key not in report:
+            info = read_json(root / key / PROJECT_FILE, {})
+            report[key] = {
+                "name": info.get("name", key),
+                "path": info.get("path"),
+                "tool_calls": 0,
+                "tool_failures": 0,
+                "tools": Counter(),
+                "notifications": 0,
+                "compactions": 0,
+            }
+        return report[key]
+
+    for key, event in iter_events("tool_use", days, projects):
+        stats = project(key)
+        stats["tool_calls"] += 1
+        stats["tool_failures"] += 0 if event.get("success", True) else 1
+        stats["tools"][event.get("tool_name") or "unknown"] += 1
+    for key, _ in iter_events("notifications", days, projects):
+        project(key)["notifications"] += 1
+    for key, _ in iter_events("compactions", days, projects):
+        project(key)["compactions"] += 1
+
+    for stats in report.values():
+        stats["tools"] = dict(stats["tools"].most_common())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet-wide telemetry report")
+    parser.add_argument("--days", type=int, default=7, help="Days to include (default: 7)")
+    parser.add_argument("--project", action="append", help="Restrict to a project (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if store_root() is None:
+        print("Global telemetry is disabled. Set OPENCODE_GLOBAL_TELEMETRY=1.", file=sys.stderr)
+        sys.exit(1)
+
+    report = build_report(args.days, args.project)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'Project':<30} {'Calls':>8} {'Fail':>6} {'Notif':>6} {'Compact':>8}  Top tools")
+    for key, stats in sorted(report.items(), key=lambda item: -item[1]["tool_calls"]):
+        top = ", ".join(f"{tool}={n}" for tool, n in list(stats["tools"].items())[:3])
+        print(
+            f"{key:<30} {stats['tool_calls']:>8} {stats['tool_failures']:>6} "
+            f"{stats['notifications']:>6} {stats['compactions']:>8}  {top}"
+        )
+
+
+if __name__ == "__main__":
+    main()
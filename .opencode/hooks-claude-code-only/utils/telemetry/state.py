@@ -0,0 +1,113 @@
+"""
+Locked JSON State Files
+=======================
+Small on-disk aggregates shared by every hook process in a workspace.
+
+Hooks run as short-lived processes, often several at once when subagents
+work in parallel, so every read-modify-write of a state file happens under
+an exclusive ``fcntl`` lock on a sidecar ``.lock`` file and is published
+with an atomic rename. Readers never see a half-written file.
+"""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to unlocked updates
+    fcntl = None
+
+
+def get_log_dir() -> Path:
+    """Return the workspace log directory, creating it if needed."""
+    log_dir = Path.cwd() / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    return log_dir
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive advisory lock for ``path`` for the duration of the block."""
+    lock_path = path.with_name(path.name + ".lock")
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def read_json(path: Path, default: Any) -> Any:
+    """Read a JSON file, returning ``default`` if it is missing or corrupt."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        return default
+
+
+def _default_mode() -> int:
+    """Mode a plain ``open()`` would create files with under the current umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Replace ``path`` with ``text`` via a temp file and rename."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        # mkstemp creates 0600 files; exports such as the Prometheus textfile
+        # must stay readable by collectors running as another user
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, _default_mode())
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def update_json(
+    path: Path,
+    default: Callable[[], Any],
+    update: Callable[[Any], Any],
+    after_write: Optional[Callable[[Any], None]] = None,
+) -> Any:
+    """
+    Apply ``update`` to the JSON document at ``path`` under an exclusive lock.
+
+    Args:
+        path: State file to update
+        default: Factory for the initial document when the file is missing
+        update: Function receiving the current document; its return value
+            (or the mutated document, if it returns None) is written back
+        after_write: Called with the written document while the lock is
+            still held, for files derived from it that must not be
+            overwritten out of order by concurrent writers
+
+    Returns:
+        The document as written
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with file_lock(path):
+        data = read_json(path, None)
+        if data is None:
+            data = default()
+        result = update(data)
+        if result is not None:
+            data = result
+        write_atomic(path, json.dumps(data, separators=(",", ":")))
+        if after_write is not None:
+            after_write(data)
+    return data
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Per-Tool Metrics
+================
+Aggregated tool-call counters and latency histograms.
+
+Every hook invocation folds one event into ``logs/.tool_metrics.json``. The
+aggregate holds a fixed-size record per tool, so an update costs the same no
+matter how many calls have been recorded. Tool latencies come from pairing
+the pre- and post-tool-use hooks (see ``tool_timing.py``); the hooks' own
+overhead is tracked in separate histograms. After each update two exports are
+refreshed:
+
+- ``logs/tool_metrics.prom``: Prometheus textfile-collector format
+  (override the path with ``OPENCODE_METRICS_TEXTFILE``)
+- ``logs/tool_metrics.json``: JSON snapshot with derived error rates
+
+Usage:
+    python3 tool_metrics.py           # Print the JSON snapshot
+    python3 tool_metrics.py --prom    # Print the Prometheus exposition
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+from state import get_log_dir, read_json, update_json, write_atomic
+
+# Upper bounds (milliseconds) of the latency histogram buckets: a 1-1.5-2-3-5-7.5
+# series per decade from 1 ms to 750 s, dense enough for p95/p99 estimates
+# within ~25%. The last bucket is the implicit +Inf overflow.
+LATENCY_BUCKETS_MS = [
+    m * 10**e for e in range(0, 6) for m in (1, 1.5, 2, 3, 5, 7.5)
+]
+
+AGGREGATE_FILE = ".tool_metrics.json"
+SNAPSHOT_FILE = "tool_metrics.json"
+TEXTFILE = "tool_metrics.prom"
+
+
+def new_histogram() -> dict:
+    return {"counts": [0] * (len(LATENCY_BUCKETS_MS) + 1), "sum_ms": 0.0, "count": 0}
+
+
+def new_tool_stats() -> dict:
+    return {"calls": 0, "failures": 0, "output_bytes": 0, "latency": new_histogram()}
+
+
+def new_aggregate() -> dict:
+    return {"version": 1, "buckets_ms": LATENCY_BUCKETS_MS, "tools": {}, "hooks": {}, "updated": None}
+
+
+def observe(histogram: dict, value_ms: float) -> None:
+    """Add one observation to a bucketed histogram."""
+    index = len(LATENCY_BUCKETS_MS)
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if value_ms <= bound:
+            index = i
+            break
+    histogram["counts"][index] += 1
+    histogram["sum_ms"] += value_ms
+    histogram["count"] += 1
+
+
+def quantile(histogram: dict, q: float) -> Optional[float]:
+    """
+    Estimate a quantile from a bucketed histogram.
+
+    Interpolates linearly inside the bucket holding the target rank, the
+    same estimate Prometheus' ``histogram_quantile`` produces. Observations
+    in the overflow bucket are reported at the largest finite bound.
+    """
+    total = histogram["count"]
+    if not total:
+        return None
+
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(LATENCY_BUCKETS_MS, histogram["counts"]):
+        if count and cumulative + count >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def latency_summary(histogram: dict) -> dict:
+    count = histogram["count"]
+    return {
+        "count": count,
+        "avg_ms": histogram["sum_ms"] / count if count else None,
+        "p50_ms": quantile(histogram, 0.50),
+        "p95_ms": quantile(histogram, 0.95),
+        "p99_ms": quantile(histogram, 0.99),
+    }
+
+
+def record_tool_call(
+    tool_name: str,
+    success: bool,
+    output_bytes: int = 0,
+    duration_ms: Optional[float] = None,
+    hook_overhead_ms: Optional[dict] = None,
+    log_dir: Optional[Path] = None,
+) -> dict:
+    """
+    Fold one tool call into the aggregate and refresh the exports.
+
+    Args:
+        tool_name: Name of the tool that ran
+        success: Whether the call succeeded
+        output_bytes: Size of the tool output
+        duration_ms: Tool execution time, if known
+        hook_overhead_ms: Time spent in each hook for this call, keyed by
+            hook name
+
+    Returns:
+        The updated aggregate
+    """
+    log_dir = log_dir or get_log_dir()
+    tool_name = tool_name or "unknown"
+
+    def apply(aggregate: dict) -> Optional[dict]:
+        aggregate = _current_layout(aggregate)
+        stats = aggregate["tools"].setdefault(tool_name, new_tool_stats())
+        stats["calls"] += 1
+        if not success:
+            stats["failures"] += 1
+        stats["output_bytes"] += output_bytes
+        if duration_ms is not None:
+            observe(stats["latency"], duration_ms)
+        hooks = aggregate.setdefault("hooks", {})
+        for hook_name, overhead_ms in (hook_overhead_ms or {}).items():
+            if overhead_ms is not None:
+                observe(hooks.setdefault(hook_name, new_histogram()), overhead_ms)
+        aggregate["updated"] = datetime.now().isoformat()
+        return aggregate
+
+    # Export under the aggregate's lock: a slower writer must not replace the
+    # exports with an older aggregate, or the counters would go backwards
+    return update_json(
+        log_dir / AGGREGATE_FILE,
+        new_aggregate,
+        apply,
+        after_write=lambda aggregate: export(aggregate, log_dir),
+    )
+
+
+def record_hook_overhead(hook_name: str, overhead_ms: float, log_dir: Optional[Path] = None) -> None:
+    """
+    Fold a hook's own run time into the aggregate as a separate update.
+
+    The post-tool-use hook calls this last, so its overhead includes the
+    metrics, export and ledger writes made earlier in the same run (but not
+    this update). The exports are not refreshed for it; they pick the sample
+    up with the next tool call.
+    """
+    def apply(aggregate: dict) -> dict:
+        aggregate = _current_layout(aggregate)
+        observe(aggregate.setdefault("hooks", {}).setdefault(hook_name, new_histogram()), overhead_ms)
+        return aggregate
+
+    update_json((log_dir or get_log_dir()) / AGGREGATE_FILE, new_aggregate, apply)
+
+
+def _current_layout(aggregate: dict) -> dict:
+    if aggregate.get("buckets_ms") != LATENCY_BUCKETS_MS:
+        # Bucket layout changed: histograms are not comparable, start over
+        return new_aggregate()
+    return aggregate
+
+
+def snapshot(aggregate: dict) -> dict:
+    """Build the JSON snapshot with derived per-tool rates."""
+    tools = {}
+    for name, stats in sorted(aggregate["tools"].items()):
+        tools[name] = {
+            "calls": stats["calls"],
+            "failures": stats["failures"],
+            "error_rate": stats["failures"] / stats["calls"] if stats["calls"] else 0.0,
+            "output_bytes": stats["output_bytes"],
+            "latency": latency_summary(stats["latency"]),
+        }
+    hooks = {name: latency_summary(h) for name, h in sorted(aggregate.get("hooks", {}).items())}
+    return {"updated": aggregate.get("updated"), "tools": tools, "hook_overhead": hooks}
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus_text(aggregate: dict) -> str:
+    """Render the aggregate in the Prometheus text exposition format."""
+    lines = [
+        "# HELP opencode_tool_calls_total Tool calls observed by the post-tool-use hook.",
+        "# TYPE opencode_tool_calls_total counter",
+    ]
+    tools = sorted(aggregate["tools"].items())
+    for name, stats in tools:
+        lines.append(f'opencode_tool_calls_total{{tool="{_escape_label(name)}"}} {stats["calls"]}')
+
+    lines += [
+        "# HELP opencode_tool_failures_total Tool calls that reported failure.",
+        "# TYPE opencode_tool_failures_total counter",
+    ]
+    for name, stats in tools:
+        lines.append(f'opencode_tool_failures_total{{tool="{_escape_label(name)}"}} {stats["failures"]}')
+
+    lines += [
+        "# HELP opencode_tool_output_bytes_total Bytes of tool output produced.",
+        "# TYPE opencode_tool_output_bytes_total counter",
+    ]
+    for name, stats in tools:
+        lines.append(f'opencode_tool_output_bytes_total{{tool="{_escape_label(name)}"}} {stats["output_bytes"]}')
+
+    lines += [
+        "# HELP opencode_tool_latency_seconds Tool execution latency.",
+        "# TYPE opencode_tool_latency_seconds histogram",
+    ]
+    for name, stats in tools:
+        lines += _histogram_lines("opencode_tool_latency_seconds", f'tool="{_escape_label(name)}"', stats["latency"])
+
+    lines += [
+        "# HELP opencode_hook_overhead_seconds Time spent inside the tool-use hooks themselves.",
+        "# TYPE opencode_hook_overhead_seconds histogram",
+    ]
+    for name, histogram in sorted(aggregate.get("hooks", {}).items()):
+        lines += _histogram_lines("opencode_hook_overhead_seconds", f'hook="{_escape_label(name)}"', histogram)
+
+    return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(metric: str, label: str, histogram: dict) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, histogram["counts"]):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{label},le="{bound / 1000:g}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {histogram["count"]}')
+    lines.append(f'{metric}_sum{{{label}}} {histogram["sum_ms"] / 1000:.6f}')
+    lines.append(f'{metric}_count{{{label}}} {histogram["count"]}')
+    return lines
+
+
+def export(aggregate: dict, log_dir: Path) -> None:
+    """Write the Prometheus textfile and JSON snapshot next to the aggregate."""
+    textfile = Path(os.getenv("OPENCODE_METRICS_TEXTFILE", "") or log_dir / TEXTFILE)
+    write_atomic(textfile, prometheus_text(aggregate))
+    write_atomic(log_dir / SNAPSHOT_FILE, json.dumps(snapshot(aggregate), indent=2))
+
+
+def load_aggregate(log_dir: Optional[Path] = None) -> dict:
+    return read_json((log_dir or get_log_dir()) / AGGREGATE_FILE, None) or new_aggregate()
+
+
+def main():
+    aggregate = load_aggregate()
+    if "--prom" in sys.argv[1:]:
+        print(prometheus_text(aggregate), end="")
+    else:
+        print(json.dumps(snapshot(aggregate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Tool Call Timing
+================
+Pairs pre- and post-tool-use hook invocations to measure tool latency.
+
+``pre_tool_use.py`` opens a start mark just before it lets the tool run and
+``post_tool_use.py`` closes it at the moment its own process started, so the
+duration excludes the pre hook's checks and the post hook's interpreter
+startup and work. It still includes the pre hook's interpreter shutdown and
+the CLI's dispatch between the two hooks, which neither hook can observe.
+Each hook's overhead is measured from its process start, interpreter startup
+included. Marks are tiny files under ``logs/.inflight/<session>/`` named
+after the tool-call identity; each has a single writer and a single reader,
+so no locking is needed.
+
+Timestamps come from ``time.monotonic_ns()``, which reads the system-wide
+monotonic clock and is therefore comparable across the two hook processes.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+from state import get_log_dir
+
+INFLIGHT_DIR = ".inflight"
+
+# Marks left behind by tools that never completed (crashes, interrupted
+# sessions) are swept once they are older than this.
+STALE_MARK_SECONDS = 3600
+
+
+def call_key(input_data: dict) -> str:
+    """Return a stable identity for a tool call shared by both hooks."""
+    tool_use_id = input_data.get("tool_use_id")
+    if tool_use_id:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", str(tool_use_id))
+
+    # Older payloads carry no call id: identify the call by its content
+    payload = json.dumps(
+        [input_data.get("tool_name", ""), input_data.get("tool_input", {})],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _mark_path(input_data: dict, log_dir: Optional[Path] = None) -> Path:
+    session = re.sub(r"[^A-Za-z0-9_.-]", "_", str(input_data.get("session_id") or "unknown"))
+    return (log_dir or get_log_dir()) / INFLIGHT_DIR / session / call_key(input_data)
+
+
+def process_start_ns(fallback_ns: int) -> int:
+    """
+    Estimate when the current process started, on the monotonic clock.
+
+    Python startup happens before a hook's first line runs, so a timestamp
+    taken at import time misses it. The start time in ``/proc/self/stat`` is
+    only available on Linux and has clock-tick resolution (usually 10 ms);
+    elsewhere ``fallback_ns`` is returned.
+
+    Args:
+        fallback_ns: Monotonic time taken as early as possible in the hook
+    """
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            stat = f.read()
+        # Fields after the parenthesised command name start at field 3;
+        # field 22 is the start time in clock ticks since boot
+        start_ticks = int(stat[stat.rindex(b")") + 2:].split()[19])
+        hz = os.sysconf("SC_CLK_TCK")
+        # Middle of the tick the process started in
+        start_boot_ns = (start_ticks * 10**9 + 10**9 // 2) // hz
+        age_ns = time.clock_gettime_ns(time.CLOCK_BOOTTIME) - start_boot_ns
+        now_ns = time.monotonic_ns()
+    except (OSError, ValueError, IndexError, AttributeError):
+        return fallback_ns
+    return min(fallback_ns, now_ns - max(0, age_ns))
+
+
+def elapsed_ms(start_ns: int) -> float:
+    return (time.monotonic_ns() - start_ns) / 1e6
+
+
+def open_mark(input_data: dict, hook_ms: float, log_dir: Optional[Path] = None) -> None:
+    """
+    Record the start of a tool call.
+
+    Args:
+        input_data: Pre-tool-use hook payload
+        hook_ms: Time the pre-tool-use hook spent before allowing the call
+    """
+    path = _mark_path(input_data, log_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"start_ns": time.monotonic_ns(), "hook_ms": hook_ms}))
+
+
+def close_mark(input_data: dict, end_ns: int, log_dir: Optional[Path] = None) -> tuple[Optional[float], Optional[float]]:
+    """
+    Close the start mark of a tool call.
+
+    Args:
+        input_data: Post-tool-use hook payload
+        end_ns: Monotonic time at which the post-tool-use hook process
+            started (see ``process_start_ns``)
+
+    Returns:
+        (tool duration in ms, pre-hook overhead in ms); both None if the
+        call has no open mark
+    """
+    path = _mark_path(input_data, log_dir)
+    try:
+        mark = json.loads(path.read_text())
+        path.unlink()
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        return None, None
+
+    if random.random() < 0.01:
+        sweep_stale_marks(path.parent.parent)
+
+    duration_ms = max(0.0, (end_ns - mark["start_ns"]) / 1e6)
+    return duration_ms, mark.get("hook_ms")
+
+
+def sweep_stale_marks(inflight_dir: Path) -> None:
+    """Remove marks for tool calls that never completed."""
+    cutoff = time.time() - STALE_MARK_SECONDS
+    for mark in inflight_dir.glob("*/*"):
+        try:
+            if mark.stat().st_mtime < cutoff:
+                mark.unlink()
+        except OSError:
+            pass
+    for session_dir in inflight_dir.iterdir():
+        try:
+            session_dir.rmdir()
+        except OSError:
+            pass
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Prompt Optimizer Benchmark
+
+Measure end-to-end optimize throughput offline against a simulated LLM with
+realistic latency, errors and rate limits.
+
+Usage:
+    python3 benchmark-optimizer.py
+    python3 benchmark-optimizer.py --workers 1 4 16 64 --suite-sizes 50 200
+    python3 benchmark-optimizer.py --latency lognormal --median-ms 400 --rpm 600 --json
+    python3 benchmark-optimizer.py --workers 64 --capacity 8 --adaptive
+    python3 benchmark-optimizer.py --workers 32 --rpm 600 --adaptive --time-scale 0.05
+"""
+
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+_spec = importlib.util.spec_from_file_location(
+    'optimize_prompt', Path(__file__).with_name('optimize-prompt.py')
+)
+optimize_prompt = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(optimize_prompt)
+
+PromptOptimizer = optimize_prompt.PromptOptimizer
+TestCase = optimize_prompt.TestCase
+
+LATENCY_MODELS = ('fixed', 'uniform', 'exponential', 'lognormal')
+LABELS = ['Positive', 'Negative', 'Neutral']
+POSITIVE_WORDS = ('great', 'loved', 'fast')
+NEGATIVE_WORDS = ('awful', 'broken', 'slow')
+
+
+def true_label(text: str) -> str:
+    """Ground-truth sentiment shared by the simulated client and make_suite."""
+    words = text.lower().split()
+    score = sum(w in POSITIVE_WORDS for w in words) - sum(w in NEGATIVE_WORDS for w in words)
+    return LABELS[0] if score > 0 else LABELS[1] if score < 0 else LABELS[2]
+
+
+class SimulatedRateLimitError(Exception):
+    """Simulated provider 429, shaped like the errors SDK clients raise."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"429 Too Many Requests (retry after {retry_after:.3f}s)")
+        self.retry_after = retry_after
+
+
+class SimulatedLLMClient:
+    """
+    Seeded stand-in for an LLM API with configurable latency and failures.
+
+    Every outcome is drawn from an RNG keyed by (seed, prompt, repeat), so a
+    given prompt gets the same latency, error and answer in every run no
+    matter how calls interleave across threads.
+
+    Failures:
+        error_rate: Fraction of calls that fail and return an empty response
+        rpm: Requests-per-minute quota; calls over it raise
+            SimulatedRateLimitError (status_code 429, with a retry_after hint)
+            for the caller to handle. With raise_rate_limits=False the client
+            instead sleeps retry_after_ms and retries by itself, as some
+            provider SDKs do
+        capacity: Concurrent calls the provider serves before it starts
+            queueing; latency grows in proportion to the overload
+    """
+
+    def __init__(self, seed: int = 0, latency: str = 'lognormal',
+                 median_ms: float = 200.0, spread: float = 0.5,
+                 error_rate: float = 0.0, rpm: Optional[int] = None,
+                 retry_after_ms: float = 1000.0, accuracy: float = 0.7,
+                 capacity: Optional[int] = None, time_scale: float = 1.0,
+                 raise_rate_limits: bool = True):
+        """
+        Args:
+            seed: Seed for every simulated outcome
+            latency: Latency model, one of LATENCY_MODELS
+            median_ms: Median (or fixed) latency per call
+            spread: Shape of the distribution: sigma for lognormal, +/- fraction
+                of the median for uniform; ignored for fixed and exponential
+            error_rate: Probability that a call fails
+            rpm: Requests per minute before calls are rate limited (None: unlimited)
+            retry_after_ms: Minimum back-off before a rate-limited call may retry
+            accuracy: Probability of answering with the correct label
+            capacity: Concurrent calls served at full speed (None: unlimited)
+            time_scale: Multiplier applied to every sleep, to run long
+                simulations quickly (quotas are scaled accordingly)
+            raise_rate_limits: Raise on calls over the rpm quota instead of
+                retrying them inside the client
+        """
+        if latency not in LATENCY_MODELS:
+            raise ValueError(f"Unknown latency model {latency!r}; choose from {LATENCY_MODELS}")
+        self.seed = seed
+        self.latency = latency
+        self.median_ms = median_ms
+        self.spread = spread
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.retry_after_ms = retry_after_ms
+        self.accuracy = accuracy
+        self.capacity = capacity
+        self.time_scale = time_scale
+        self.raise_rate_limits = raise_rate_limits
+        self.model_config = {'client': 'simulated', 'seed': seed}
+
+        self._lock = threading.Lock()
+        self._repeats = {}
+        self._window = deque()
+        self._active = 0
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.latencies_ms = []
+
+    def _rng(self, prompt: str) -> np.random.Generator:
+        with self._lock:
+            repeat = self._repeats.get(prompt, 0)
+            self._repeats[prompt] = repeat + 1
+        digest = hashlib.sha256(f"{self.seed}\0{repeat}\0{prompt}".encode('utf-8')).digest()
+        return np.random.default_rng(int.from_bytes(digest[:8], 'little'))
+
+    def _draw_latency_ms(self, rng: np.random.Generator) -> float:
+        if self.latency == 'fixed':
+            return self.median_ms
+        if self.latency == 'uniform':
+            return self.median_ms * rng.uniform(1 - self.spread, 1 + self.spread)
+        if self.latency == 'exponential':
+            return rng.exponential(self.median_ms / np.log(2))
+        return self.median_ms * rng.lognormal(0.0, self.spread)
+
+    def _admit(self) -> float:
+        """
+        Take a slot in the sliding one-minute quota window, if one is free.
+
+        Returns:
+            0.0 if admitted, else the seconds to wait before retrying: until
+            the oldest call leaves the window, and at least retry_after_ms
+        """
+        if self.rpm is None:
+            return 0.0
+        window = 60.0 * self.time_scale
+        now = time.monotonic()
+        with self._lock:
+            while self._window and now - self._window[0] >= window:
+                self._window.popleft()
+            if len(self._window) < self.rpm:
+                self._window.append(now)
+                return 0.0
+            slot_free = self._window[0] + window - now
+        return max(slot_free, self.retry_after_ms / 1000 * self.time_scale)
+
+    def complete(self, prompt: str) -> str:
+        start = time.perf_counter()
+
+        throttled = 0
+        while True:
+            retry_after = self._admit()
+            if not retry_after:
+                break
+            if self.raise_rate_limits:
+                with self._lock:
+                    self.rate_limited += 1
+                raise SimulatedRateLimitError(retry_after)
+            throttled += 1
+            time.sleep(retry_after)
+
+        # Only admitted calls count as a repeat, so a retried 429 draws the
+        # same outcome it would have without rate limiting
+        rng = self._rng(prompt)
+        latency_ms = self._draw_latency_ms(rng)
+        with self._lock:
+            self._active += 1
+            active = self._active
+        if self.capacity and active > self.capacity:
+            latency_ms *= active / self.capacity
+        time.sleep(latency_ms / 1000 * self.time_scale)
+        with self._lock:
+            self._active -= 1
+        failed = rng.random() < self.error_rate
+        if failed:
+            response = ''
+        else:
+            # Prompts that ask for reasoning answer a little better, so the
+            # optimizer has real variations to choose between
+            accuracy = min(1.0, self.accuracy + (0.15 if 'step by step' in prompt else 0.0))
+            truth = true_label(prompt)
+            response = truth if rng.random() < accuracy else LABELS[int(rng.integers(len(LABELS)))]
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self.rate_limited += throttled
+            self.latencies_ms.append(elapsed_ms)
+        return response
+
+
+def make_suite(size: int, seed: int = 0) -> List[TestCase]:
+    """Synthetic sentiment cases labelled with true_label."""
+    rng = np.random.default_rng(seed)
+    words = list(POSITIVE_WORDS + NEGATIVE_WORDS) + ['fine', 'average', 'okay']
+    suite = []
+    for i in range(size):
+        text = f"{' '.join(rng.choice(words, 4))} #{i}"
+        suite.append(TestCase(input={'text': text}, expected_output=true_label(text)))
+    return suite
+
+
+def run_once(client_kwargs: Dict[str, Any], workers: int, suite_size: int,
+             iterations: int, screening: Optional[str] = None,
+             adaptive: bool = False) -> Dict[str, Any]:
+    """
+    Run one optimize session and report throughput and latency.
+
+    With adaptive, `workers` is the ceiling of an AIMDLimiter instead of a
+    fixed pool size.
+    """
+    client = SimulatedLLMClient(**client_kwargs)
+    limiter = optimize_prompt.AIMDLimiter(max_limit=workers) if adaptive else None
+    optimizer = PromptOptimizer(client, make_suite(suite_size, client.seed), max_workers=workers,
+                                concurrency_limiter=limiter)
+    base_prompt = "Classify the sentiment of: {text}\nSentiment:"
+
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = optimizer.optimize(base_prompt, max_iterations=iterations, screening=screening)
+    finally:
+        optimizer.shutdown()
+    wall = time.perf_counter() - start
+
+    latencies = np.asarray(client.latencies_ms or [0.0])
+    completed = max(1, len(result['history']))
+    return {
+        'workers': workers,
+        'suite_size': suite_size,
+        'iterations': completed,
+        'calls': client.calls,
+        'wall_s': wall,
+        'calls_per_s': client.calls / wall if wall else 0.0,
+        'wall_per_iteration_s': wall / completed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'errors': client.errors,
+        'rate_limited': client.rate_limited,
+        'retries': optimizer.retry_stats['retries'],
+        'retry_wait_s': optimizer.retry_stats['retry_wait_s'],
+        'retries_exhausted': optimizer.retry_stats['exhausted'],
+        'best_score': result['best_score'],
+        'final_limit': limiter.stats()['limit'] if limiter else workers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PromptOptimizer throughput")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 32],
+                        help="Executor sizes to sweep")
+    parser.add_argument('--suite-sizes', type=int, nargs='+', default=[50, 200],
+                        help="Test suite sizes to sweep")
+    parser.add_argument('--iterations', type=int, default=3, help="Optimize iterations per run")
+    parser.add_argument('--screening', choices=['halving'], help="Screening mode passed to optimize")
+    parser.add_argument('--latency', choices=LATENCY_MODELS, default='lognormal')
+    parser.add_argument('--median-ms', type=float, default=50.0)
+    parser.add_argument('--spread', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, help="Requests-per-minute quota (default: unlimited)")
+    parser.add_argument('--retry-after-ms', type=float, default=1000.0)
+    parser.add_argument('--client-retries', action='store_true',
+                        help="Sleep through rate limits inside the simulated client instead of "
+                             "raising 429s to the optimizer")
+    parser.add_argument('--capacity', type=int,
+                        help="Concurrent calls the simulated provider serves before queueing")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Let an AIMD limiter pick concurrency, up to each --workers value")
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help="Scale all simulated time, e.g. 0.1 to run 10x faster")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    client_kwargs = {
+        'seed': args.seed,
+        'latency': args.latency,
+        'median_ms': args.median_ms,
+        'spread': args.spread,
+        'error_rate': args.error_rate,
+        'rpm': args.rpm,
+        'retry_after_ms': args.retry_after_ms,
+        'capacity': args.capacity,
+        'time_scale': args.time_scale,
+        'raise_rate_limits': not args.client_retries,
+    }
+
+    rows = []
+    if not args.json:
+        print(f"{'Workers':>7} {'Cases':>6} {'Calls':>7} {'Wall s':>8} {'Calls/s':>9} "
+              f"{'s/iter':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'429s':>6} {'Retries':>7} "
+              f"{'Limit':>6}")
+    for suite_size in args.suite_sizes:
+        for workers in args.workers:
+            row = run_once(client_kwargs, workers, suite_size, args.iterations, args.screening,
+                           args.adaptive)
+            rows.append(row)
+            if not args.json:
+                print(f"{row['workers']:>7} {row['suite_size']:>6} {row['calls']:>7} "
+                      f"{row['wall_s']:>8.2f} {row['calls_per_s']:>9.1f} "
+                      f"{row['wall_per_iteration_s']:>8.2f} {row['p50_ms']:>8.1f} "
+                      f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['rate_limited']:>6} "
+                      f"{row['retries']:>7} {row['final_limit']:>6}")
+
+    if args.json:
+        print(json.dumps({'config': client_kwargs, 'results': rows}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,108 +5,1242 @@ Prompt Optimization Script
 Automatically test and optimize prompts using A/B testing and metrics tracking.
 """
 
+import hashlib
 import json
+import math
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
 import time
-from typing import List, Dict, Any
+import zlib
+from collections import OrderedDict
+from itertools import chain
+from typing import Callable, Iterator, List, Dict, Any, Optional
 from dataclasses import dataclass
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import numpy as np
 
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
-@dataclass
+
+@dataclass(slots=True)
 class TestCase:
     input: Dict[str, Any]
     expected_output: str
     metadata: Dict[str, Any] = None
 
 
+def iter_test_cases(path: str, shard: int = 0, num_shards: int = 1) -> Iterator[TestCase]:
+    """
+    Lazily load test cases from a JSONL file.
+
+    Each line is an object with "input", "expected_output" and optional
+    "metadata". With num_shards > 1 only every num_shards-th line starting at
+    shard is parsed, so workers can split one file without coordination.
+    """
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f):
+            if line_number % num_shards != shard or not line.strip():
+                continue
+            record = json.loads(line)
+            yield TestCase(
+                input=record['input'],
+                expected_output=record['expected_output'],
+                metadata=record.get('metadata')
+            )
+
+
+class ResponseCache:
+    """
+    Two-level LLM response cache: an in-memory LRU in front of a SQLite store.
+
+    Entries are keyed by a hash of (model config, rendered prompt[, sample]),
+    so re-running an experiment only pays for prompts that actually changed.
+    Use path=":memory:" for a cache that lives only as long as the process.
+    """
+
+    def __init__(self, path: str = '.prompt_cache.sqlite', max_memory_entries: int = 10000):
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)'
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model_config: Dict[str, Any], prompt: str, sample: Optional[int] = None) -> str:
+        """Hash the request identity into a fixed-size cache key."""
+        payload = json.dumps([model_config, prompt, sample], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+            row = self._db.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)',
+                (key, response, time.time())
+            )
+            self._db.commit()
+            self._remember(key, response)
+
+    def _remember(self, key: str, response: str):
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count model tokens in text.
+
+    Uses tiktoken's cl100k_base encoding when it is installed; otherwise
+    approximates BPE by counting word runs and individual punctuation marks,
+    which tracks real token counts far better than whitespace splitting.
+    """
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            _encoding = False  # Encoding unavailable (e.g. offline): use the fallback
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def pareto_frontier(candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Keep the candidates no other candidate beats on every objective.
+
+    Each candidate is {'prompt': ..., 'metrics': ...}; objectives are higher
+    avg_accuracy, lower p95_latency and lower avg_tokens.
+    """
+    def objectives(candidate):
+        m = candidate['metrics']
+        return (-m['avg_accuracy'], m['p95_latency'], m['avg_tokens'])
+
+    points = [objectives(c) for c in candidates]
+    frontier = []
+    for i, candidate in enumerate(candidates):
+        dominated = any(
+            all(o <= p for o, p in zip(other, points[i])) and other != points[i]
+            for j, other in enumerate(points) if j != i
+        )
+        if not dominated and candidate['prompt'] not in {c['prompt'] for c in frontier}:
+            frontier.append(candidate)
+    return frontier
+
+
+class CheckpointLog:
+    """
+    Append-only JSONL log of optimize progress for crash-safe resume.
+
+    Per-case results are appended as soon as they complete and each finished
+    iteration adds a summary record, so an interrupted run loses at most the
+    calls that were in flight. A torn final line is ignored when reading.
+    A log holds one run: starting a fresh run truncates it.
+    """
+
+    def __init__(self, path: str, fresh: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'w' if fresh else 'a')
+
+    @staticmethod
+    def read(path: str) -> List[Dict[str, Any]]:
+        records = []
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # Torn write from a crash
+        return records
+
+    def append(self, record: Dict[str, Any], sync: bool = False):
+        line = json.dumps(record, default=float) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def case_key(prompt_template: str, test_case: TestCase) -> str:
+    """Stable identity of a (prompt, test case) evaluation across runs."""
+    payload = json.dumps([prompt_template, test_case.input, test_case.expected_output],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch with bounded relative error.
+
+    Values are counted in logarithmic buckets (the DDSketch scheme): every
+    reported quantile is within relative_accuracy of the true value, memory
+    depends only on the value range, and two sketches merge by adding
+    bucket counts, so per-worker sketches combine exactly.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1):
+        self.count += count
+        if value <= 0:
+            self.zero_count += count
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def merge(self, other: 'QuantileSketch'):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return float('nan')
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # Bucket midpoint in the relative-error sense
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class MetricAccumulator:
+    """
+    Constant-memory running metrics for one prompt.
+
+    Keeps sums for the mean metrics and a QuantileSketch for latency, so
+    suites of any size aggregate in fixed memory, and accumulators from
+    different workers or batches combine with merge(). Per-case accuracy
+    scores are kept only when keep_scores is set (paired significance tests
+    need them). Phase timings (see PHASES) get a sum and a sketch each.
+    """
+
+    def __init__(self, keep_scores: bool = False):
+        self.count = 0
+        self.accuracy_sum = 0.0
+        self.latency_sum = 0.0
+        self.token_sum = 0.0
+        self.success_sum = 0.0
+        self.latency_sketch = QuantileSketch()
+        self.scores = {} if keep_scores else None
+        self.phases = {}
+
+    def add_result(self, result: Dict[str, Any]):
+        self.count += 1
+        self.latency_sum += result['latency']
+        self.token_sum += result['token_count']
+        self.success_sum += result['success_rate']
+        self.latency_sketch.add(result['latency'])
+        for name, ns in result.get('phases', {}).items():
+            self.add_phase(name, ns)
+
+    def add_phase(self, name: str, ns: float, count: int = 1):
+        """Record `count` cases that each spent `ns` nanoseconds in a phase."""
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = [0, 0.0, QuantileSketch()]
+        phase[0] += count
+        phase[1] += ns * count
+        phase[2].add(ns, count)
+
+    def add_scores(self, scores: np.ndarray, case_ids: Optional[List[int]] = None):
+        self.accuracy_sum += float(scores.sum())
+        if self.scores is not None and case_ids is not None:
+            self.scores.update(zip(case_ids, scores.tolist()))
+
+    def merge(self, other: 'MetricAccumulator'):
+        self.count += other.count
+        self.accuracy_sum += other.accuracy_sum
+        self.latency_sum += other.latency_sum
+        self.token_sum += other.token_sum
+        self.success_sum += other.success_sum
+        self.latency_sketch.merge(other.latency_sketch)
+        for name, (count, total, sketch) in other.phases.items():
+            phase = self.phases.setdefault(name, [0, 0.0, QuantileSketch()])
+            phase[0] += count
+            phase[1] += total
+            phase[2].merge(sketch)
+        if self.scores is not None and other.scores is not None:
+            self.scores.update(other.scores)
+
+    @property
+    def avg_accuracy(self) -> float:
+        return self.accuracy_sum / self.count if self.count else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        n = self.count or 1
+        summary = {
+            'avg_accuracy': self.accuracy_sum / n,
+            'avg_latency': self.latency_sum / n,
+            'p50_latency': self.latency_sketch.quantile(0.50),
+            'p95_latency': self.latency_sketch.quantile(0.95),
+            'p99_latency': self.latency_sketch.quantile(0.99),
+            'avg_tokens': self.token_sum / n,
+            'success_rate': self.success_sum / n
+        }
+        if self.phases:
+            summary['phases'] = {
+                name: {
+                    'count': count,
+                    'avg_ms': total / count / 1e6,
+                    'p95_ms': sketch.quantile(0.95) / 1e6,
+                }
+                for name, (count, total, sketch) in self.phases.items()
+            }
+        return summary
+
+
+def paired_bootstrap(scores_a: np.ndarray, scores_b: np.ndarray, n_resamples: int = 10000,
+                     seed: int = 0, max_cells: int = 20_000_000) -> Dict[str, Any]:
+    """
+    Vectorized paired bootstrap of the mean score difference A - B.
+
+    Resamples whole test cases (keeping each A/B pair together) as index
+    matrices, in chunks of at most max_cells entries so memory stays bounded.
+
+    Returns:
+        Dict with the observed mean difference, its 95% confidence interval
+        and a two-sided p-value for "no difference" (nan difference and a
+        p-value of 1 when there are no cases)
+    """
+    diffs = np.asarray(scores_a, dtype=float) - np.asarray(scores_b, dtype=float)
+    n = len(diffs)
+    if n == 0:
+        return {'mean_difference': float('nan'), 'ci_95': (float('nan'), float('nan')), 'p_value': 1.0}
+    observed = float(diffs.mean())
+    rng = np.random.default_rng(seed)
+
+    chunk = max(1, max_cells // n)
+    means = np.empty(n_resamples)
+    for start in range(0, n_resamples, chunk):
+        stop = min(n_resamples, start + chunk)
+        means[start:stop] = diffs[rng.integers(0, n, size=(stop - start, n))].mean(axis=1)
+
+    low, high = np.percentile(means, [2.5, 97.5])
+    # Null distribution: bootstrap means re-centred on zero
+    p_value = float(np.mean(np.abs(means - observed) >= abs(observed))) if observed else 1.0
+    return {'mean_difference': observed, 'ci_95': (float(low), float(high)), 'p_value': p_value}
+
+
+def _exact_kernel(exact, intersection, response_sizes, expected_sizes):
+    return exact.astype(float)
+
+
+def _overlap_kernel(exact, intersection, response_sizes, expected_sizes):
+    # Exact match, else recall of expected words
+    recall = np.divide(intersection, expected_sizes,
+                       out=np.zeros(len(exact)), where=expected_sizes > 0)
+    return np.where(exact, 1.0, recall)
+
+
+def _f1_kernel(exact, intersection, response_sizes, expected_sizes):
+    precision = np.divide(intersection, response_sizes,
+                          out=np.zeros(len(exact)), where=response_sizes > 0)
+    recall = np.divide(intersection, expected_sizes,
+                       out=np.zeros(len(exact)), where=expected_sizes > 0)
+    total = precision + recall
+    f1 = np.divide(2 * precision * recall, total, out=np.zeros(len(exact)), where=total > 0)
+    return np.where(exact, 1.0, f1)
+
+
+# Vectorized scorers: kernel(exact, intersection, response_sizes, expected_sizes) -> scores
+SCORERS = {
+    'exact': _exact_kernel,
+    'overlap': _overlap_kernel,
+    'f1': _f1_kernel,
+}
+
+
+def register_scorer(name: str, kernel):
+    """
+    Register a scorer under a name usable as PromptOptimizer(scorer=...).
+
+    `kernel` is either a vectorized kernel for BatchScorer or a scorer class
+    whose instances provide score(responses, expected) -> np.ndarray.
+    """
+    SCORERS[name] = kernel
+
+
+def make_scorer(name: str):
+    """Build the scorer registered under name."""
+    if name not in SCORERS:
+        raise ValueError(f"Unknown scorer '{name}'. Available: {', '.join(sorted(SCORERS))}")
+    if isinstance(SCORERS[name], type):
+        return SCORERS[name]()
+    return BatchScorer(name)
+
+
+class BatchScorer:
+    """
+    Scores many (response, expected) pairs with a handful of NumPy operations.
+
+    Texts are tokenized into a shared vocabulary. Each batch is represented
+    sparsely as sorted (row, token id) keys, so set sizes and per-row
+    intersections come from np.unique / np.intersect1d / np.bincount over
+    the whole batch instead of Python sets per pair. Expected outputs are
+    tokenized once and reused across every prompt evaluated.
+    """
+
+    def __init__(self, scorer: str = 'overlap'):
+        if scorer not in SCORERS:
+            raise ValueError(f"Unknown scorer '{scorer}'. Available: {', '.join(sorted(SCORERS))}")
+        self.kernel = SCORERS[scorer]
+        self.vocab = {}
+        self._expected_cache = {}
+        self._lock = threading.Lock()
+
+    def _encode(self, texts: List[str]) -> tuple:
+        """Tokenize texts into one flat id array plus per-text lengths."""
+        vocab = self.vocab
+        tokenized = [text.lower().split() for text in texts]
+        lengths = np.fromiter(map(len, tokenized), dtype=np.int64, count=len(texts))
+        flat = list(chain.from_iterable(tokenized))
+        for token in set(flat).difference(vocab):
+            vocab[token] = len(vocab)
+        ids = np.fromiter(map(vocab.__getitem__, flat), dtype=np.int64, count=len(flat))
+        return ids, lengths
+
+    def _expected_encoding(self, expected: List[str]) -> tuple:
+        """Encode expected outputs, tokenizing each distinct text only once."""
+        cache = self._expected_cache
+        missing = [text for text in dict.fromkeys(expected) if text not in cache]
+        if missing:
+            ids, lengths = self._encode(missing)
+            for text, chunk in zip(missing, np.split(ids, np.cumsum(lengths)[:-1])):
+                cache[text] = chunk
+        chunks = [cache[text] for text in expected]
+        lengths = np.fromiter(map(len, chunks), dtype=np.int64, count=len(chunks))
+        ids = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+        return ids, lengths
+
+    @staticmethod
+    def _unique_keys(ids: np.ndarray, lengths: np.ndarray, vocab_size: int) -> np.ndarray:
+        """Encode each row's distinct tokens as sorted row * |V| + id keys."""
+        rows = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        keys = np.sort(rows * vocab_size + ids)
+        if len(keys) == 0:
+            return keys
+        return keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+
+    def score(self, responses: List[str], expected: List[str]) -> np.ndarray:
+        """Score a batch of responses against their expected outputs."""
+        n = len(responses)
+        if n == 0:
+            return np.empty(0)
+
+        with self._lock:
+            response_ids, response_lengths = self._encode(responses)
+            expected_ids, expected_lengths = self._expected_encoding(expected)
+            vocab_size = max(1, len(self.vocab))
+
+        response_keys = self._unique_keys(response_ids, response_lengths, vocab_size)
+        expected_keys = self._unique_keys(expected_ids, expected_lengths, vocab_size)
+
+        intersection = np.bincount(
+            np.intersect1d(response_keys, expected_keys, assume_unique=True) // vocab_size, minlength=n
+        )
+        response_sizes = np.bincount(response_keys // vocab_size, minlength=n)
+        expected_sizes = np.bincount(expected_keys // vocab_size, minlength=n)
+
+        # Only rows with identical token sets can be exact matches
+        exact = np.zeros(n, dtype=bool)
+        candidates = np.flatnonzero((intersection == response_sizes) & (intersection == expected_sizes))
+        for i in candidates:
+            exact[i] = responses[i].strip().lower() == expected[i].strip().lower()
+        return self.kernel(exact, intersection, response_sizes, expected_sizes)
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """Recognize provider 429s across client libraries without importing them."""
+    status = getattr(exc, 'status_code', None) or getattr(exc, 'status', None)
+    return status == 429 or 'ratelimit' in type(exc).__name__.lower()
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit using additive increase / multiplicative decrease.
+
+    Callers hold a slot for the duration of each LLM call. Every call that
+    succeeds at normal latency grows the limit by 1/limit (about +1 per
+    round of calls); a rate-limit error, or a smoothed latency above
+    latency_tolerance x the best smoothed latency seen, multiplies the
+    limit by backoff, at most once per round so one burst of slow calls
+    counts as one congestion signal. The limit therefore settles just below
+    the point where the provider starts queueing or rejecting requests.
+    """
+
+    def __init__(self, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 backoff: float = 0.7, latency_tolerance: float = 2.0, smoothing: float = 0.1,
+                 baseline_smoothing: float = 0.02):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline_smoothing = baseline_smoothing
+        self.long_latency = None
+        self._samples = 0
+        self.in_flight = 0
+        self.smoothed_latency = None
+        self.baseline_latency = None
+        self.decreases = 0
+        self._since_decrease = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False):
+        """Return a slot, adjusting the limit from the call's outcome."""
+        with self._condition:
+            self.in_flight -= 1
+            self._since_decrease += 1
+            if latency is not None and not overloaded:
+                self._samples += 1
+                if self.smoothed_latency is None:
+                    self.smoothed_latency = self.long_latency = latency
+                else:
+                    self.smoothed_latency += self.smoothing * (latency - self.smoothed_latency)
+                    # Plain mean until the long average has seen a full window
+                    weight = max(self.baseline_smoothing, 1 / self._samples)
+                    self.long_latency += weight * (latency - self.long_latency)
+                # Baseline: lowest long-run average seen, which per-call noise barely moves
+                if self._samples * self.baseline_smoothing >= 1 and (
+                        self.baseline_latency is None or self.long_latency < self.baseline_latency):
+                    self.baseline_latency = self.long_latency
+                if self.baseline_latency is not None:
+                    overloaded = self.smoothed_latency > self.latency_tolerance * self.baseline_latency
+
+            if overloaded:
+                if self._since_decrease >= int(self.limit):
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.decreases += 1
+                    self._since_decrease = 0
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'decreases': self.decreases,
+            'baseline_latency': self.baseline_latency,
+        }
+
+
+class TokenBucket:
+    """Continuously refilling bucket of `rate` units per minute, at most `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate / 60.0
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0):
+        """Block until `amount` units are available, then take them."""
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= min(amount, self.capacity):
+                    self.tokens -= amount
+                    return
+                wait = (min(amount, self.capacity) - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def consume(self, amount: float):
+        """Charge usage known only after the fact; the bucket may go into debt."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute quotas, as providers enforce them."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, prompt_tokens: int):
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None:
+            self.tokens.acquire(prompt_tokens)
+
+    def record_completion(self, completion_tokens: int):
+        if self.tokens is not None:
+            self.tokens.consume(completion_tokens)
+
+
+def hashed_ngram_embeddings(texts: List[str], dim: int = 512, ngram: int = 3) -> np.ndarray:
+    """
+    Embed texts offline as L2-normalized hashed n-gram vectors.
+
+    Each text contributes its lowercase words and character n-grams (with
+    word boundaries), hashed into `dim` signed buckets with CRC-32, which is
+    stable across processes unlike hash(). Paraphrases sharing stems and
+    word pieces land close together without any model download.
+    """
+    rows, buckets, signs = [], [], []
+    for row, text in enumerate(texts):
+        words = text.lower().split()
+        padded = f" {' '.join(words)} "
+        features = words + [padded[i:i + ngram] for i in range(len(padded) - ngram + 1)]
+        for feature in features:
+            h = zlib.crc32(feature.encode('utf-8'))
+            rows.append(row)
+            buckets.append(h % dim)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+
+    vectors = np.zeros(len(texts) * dim)
+    if rows:
+        flat = np.asarray(rows, dtype=np.int64) * dim + np.asarray(buckets, dtype=np.int64)
+        vectors = np.bincount(flat, weights=np.asarray(signs), minlength=len(texts) * dim)
+    vectors = vectors.reshape(len(texts), dim)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class SemanticScorer:
+    """
+    Scores responses by cosine similarity of embeddings to the expected output.
+
+    Expected outputs are embedded once and cached for the whole run; each
+    batch embeds only its distinct response texts, then every similarity
+    comes from one row-wise dot product over the batch matrices. Exact
+    matches still score 1.0 and negative similarities score 0.
+
+    The default embedder is the offline hashed_ngram_embeddings; any
+    callable mapping a list of texts to an (n, d) array of normalized
+    vectors (e.g. a sentence-transformers model's encode) can replace it.
+    """
+
+    def __init__(self, embedder: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 max_cached_responses: int = 100000):
+        self.embedder = embedder or hashed_ngram_embeddings
+        self.max_cached_responses = max_cached_responses
+        self._expected = ({}, [None])
+        self._responses = ({}, [None])
+        self._lock = threading.Lock()
+
+    def _lookup(self, texts: List[str], table: tuple) -> np.ndarray:
+        """Gather embeddings for texts from a (text -> row, [matrix]) table, embedding new ones."""
+        index, matrix = table
+        missing = [text for text in dict.fromkeys(texts) if text not in index]
+        if missing:
+            vectors = np.asarray(self.embedder(missing), dtype=np.float32)
+            offset = 0 if matrix[0] is None else len(matrix[0])
+            matrix[0] = vectors if matrix[0] is None else np.concatenate([matrix[0], vectors])
+            index.update((text, offset + i) for i, text in enumerate(missing))
+        rows = np.fromiter(map(index.__getitem__, texts), dtype=np.int64, count=len(texts))
+        return matrix[0][rows]
+
+    def score(self, responses: List[str], expected: List[str]) -> np.ndarray:
+        if not responses:
+            return np.empty(0)
+        with self._lock:
+            if len(self._responses[0]) > self.max_cached_responses:
+                self._responses = ({}, [None])
+            response_vectors = self._lookup(responses, self._responses)
+            expected_vectors = self._lookup(expected, self._expected)
+
+        scores = np.clip(np.einsum('ij,ij->i', response_vectors, expected_vectors), 0.0, 1.0).astype(float)
+        # Only near-identical embeddings can be exact matches
+        for i in np.flatnonzero(scores > 0.99):
+            if responses[i].strip().lower() == expected[i].strip().lower():
+                scores[i] = 1.0
+        return scores
+
+
+register_scorer('semantic', SemanticScorer)
+
+
+_process_scorers: Dict[str, tuple] = {}
+
+
+def _score_chunk(scorer: str, responses: List[str], expected: List[str], generation: int = 0) -> tuple:
+    """
+    Scoring-process task: score one chunk, reusing this process's scorer and
+    vocabulary until the submitting optimizer moves to a new scorer generation.
+    """
+    start = time.perf_counter()
+    cached = _process_scorers.get(scorer)
+    if cached is None or cached[0] != generation:
+        cached = _process_scorers[scorer] = (generation, make_scorer(scorer))
+    scores = cached[1].score(responses, expected)
+    return scores, time.perf_counter() - start
+
+
 class PromptOptimizer:
-    def __init__(self, llm_client, test_suite: List[TestCase]):
+    def __init__(self, llm_client, test_suite: List[TestCase],
+                 cache: Optional[ResponseCache] = None,
+                 model_config: Optional[Dict[str, Any]] = None,
+                 cache_samples: bool = False,
+                 scorer: str = 'overlap',
+                 score_chunk_size: int = 1024,
+                 max_workers: Optional[int] = None,
+                 checkpoint_path: Optional[str] = None,
+                 scoring_processes: Optional[int] = None,
+                 pipeline_queue_size: int = 256,
+                 concurrency_limiter: Optional[AIMDLimiter] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 max_retries: int = 5):
+        """
+        Args:
+            llm_client: Object with a complete(prompt) -> str method
+            test_suite: Test cases to evaluate prompts against
+            cache: Optional response cache shared across runs
+            model_config: Settings that affect responses (model, temperature, ...);
+                defaults to the client's model_config attribute. Required with
+                a cache, since it is part of every cache key
+            cache_samples: With temperature > 0, cache each repeated call of a
+                prompt as a separate numbered sample instead of bypassing the cache
+            scorer: Accuracy scorer name from SCORERS ("exact", "overlap", "f1",
+                "semantic", ...)
+            score_chunk_size: Responses buffered per prompt before they are
+                scored as one vectorized batch
+            max_workers: Thread pool size for LLM calls (executor default if None)
+            checkpoint_path: JSONL file that optimize writes progress to (a
+                fresh run replaces its contents); pass the same path to
+                resume() after a crash
+            scoring_processes: Score on a process pool of this size instead of
+                the calling thread, for CPU-heavy scorers (see _run_pipeline).
+                Custom scorers must be registered at import time of a module
+                the worker processes also load
+            pipeline_queue_size: Completed LLM calls that may wait for scoring
+                before the LLM call threads are held back
+            concurrency_limiter: Adapt the number of concurrent LLM calls to
+                what the provider sustains; the thread pool is sized to its
+                max_limit unless max_workers is given
+            rate_limiter: Requests/tokens per minute quotas to stay under
+            max_retries: Retries of a call rejected with a rate-limit error;
+                counts are kept in self.retry_stats
+        """
         self.client = llm_client
         self.test_suite = test_suite
         self.results_history = []
-        self.executor = ThreadPoolExecutor()
+        if max_workers is None and concurrency_limiter is not None:
+            max_workers = concurrency_limiter.max_limit
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.cache = cache
+        self.model_config = model_config or getattr(llm_client, 'model_config', None)
+        if self.model_config is None:
+            if cache is not None:
+                # A client type name alone would let different models share entries
+                raise ValueError(
+                    "A response cache needs model_config (or a client with a "
+                    "model_config attribute) naming the model and its settings"
+                )
+            self.model_config = {'client': type(llm_client).__name__}
+        self.cache_samples = cache_samples
+        self._sample_counts = {}
+        self._sample_lock = threading.Lock()
+        self.scorer = make_scorer(scorer)
+        self.scorer_name = scorer
+        self._scorer_generation = 0
+        self.score_chunk_size = score_chunk_size
+        self.max_workers = self.executor._max_workers
+        self.score_pool = ProcessPoolExecutor(max_workers=scoring_processes) if scoring_processes else None
+        self.scoring_processes = scoring_processes
+        self.pipeline_queue_size = pipeline_queue_size
+        self.pipeline_stats = {}
+        self.concurrency_limiter = concurrency_limiter
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.retry_stats = {'rate_limit_errors': 0, 'retries': 0, 'retry_wait_s': 0.0, 'exhausted': 0}
+        self._retry_lock = threading.Lock()
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = None
+        self._completed_cases = {}
+        self._recorded_iterations = set()
+
+    def _reset_scorer(self):
+        """Drop the vocabulary and cached encodings built up by the scorers."""
+        self.scorer = make_scorer(self.scorer_name)
+        self._scorer_generation += 1
 
     def shutdown(self):
         """Shutdown the thread pool executor."""
         self.executor.shutdown(wait=True)
+        if self.score_pool is not None:
+            self.score_pool.shutdown(wait=True)
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            self.checkpoint = None
 
-    def evaluate_prompt(self, prompt_template: str, test_cases: List[TestCase] = None) -> Dict[str, float]:
-        """Evaluate a prompt template against test cases in parallel."""
+    def _call_client(self, prompt: str, phases: Optional[Dict[str, int]] = None) -> str:
+        """
+        Call the LLM under the configured rate and concurrency limits.
+
+        Time spent waiting on the limiters is added to phases['throttle'].
+        Clients with a stream(prompt) method yielding text chunks are
+        streamed so phases['ttft'] can record time to first token.
+        Rate-limit errors are retried up to max_retries times, after the
+        error's retry_after seconds if it has that attribute, else after an
+        exponential backoff.
+        """
+        limiter = self.concurrency_limiter
+        stream = getattr(self.client, 'stream', None)
+        for attempt in range(self.max_retries + 1):
+            wait_start = time.perf_counter_ns()
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(count_tokens(prompt))
+            if limiter is not None:
+                limiter.acquire()
+            start = time.perf_counter()
+            if phases is not None and (limiter is not None or self.rate_limiter is not None):
+                phases['throttle'] = phases.get('throttle', 0) + time.perf_counter_ns() - wait_start
+            try:
+                if stream is None:
+                    response = self.client.complete(prompt)
+                else:
+                    chunks = []
+                    for chunk in stream(prompt):
+                        if not chunks and phases is not None:
+                            phases['ttft'] = int((time.perf_counter() - start) * 1e9)
+                        chunks.append(chunk)
+                    response = ''.join(chunks)
+            except Exception as exc:
+                rate_limited = is_rate_limit_error(exc)
+                if limiter is not None:
+                    limiter.release(overloaded=rate_limited)
+                if not rate_limited:
+                    raise
+                # Honour the provider's Retry-After hint when the error carries
+                # one; jitter keeps rejected threads from retrying in lockstep
+                retry_after = getattr(exc, 'retry_after', None)
+                delay = retry_after if retry_after is not None else min(30.0, 0.5 * 2 ** attempt)
+                delay *= 1 + 0.5 * random.random()
+                with self._retry_lock:
+                    self.retry_stats['rate_limit_errors'] += 1
+                    if attempt == self.max_retries:
+                        self.retry_stats['exhausted'] += 1
+                    else:
+                        self.retry_stats['retries'] += 1
+                        self.retry_stats['retry_wait_s'] += delay
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(delay)
+                continue
+            if limiter is not None:
+                limiter.release(latency=time.perf_counter() - start)
+            if self.rate_limiter is not None:
+                self.rate_limiter.record_completion(count_tokens(response))
+            return response
+
+    def _complete(self, prompt: str, phases: Optional[Dict[str, int]] = None) -> str:
+        """Get an LLM response, going through the response cache if configured."""
+        if self.cache is None:
+            return self._call_client(prompt, phases)
+
+        sample = None
+        if self.model_config.get('temperature', 0) > 0:
+            if not self.cache_samples:
+                # Sampled responses differ per call: caching one would freeze it
+                return self._call_client(prompt, phases)
+            base_key = ResponseCache.make_key(self.model_config, prompt)
+            with self._sample_lock:
+                sample = self._sample_counts.get(base_key, 0)
+                self._sample_counts[base_key] = sample + 1
+
+        key = ResponseCache.make_key(self.model_config, prompt, sample)
+        response = self.cache.get(key)
+        if response is None:
+            response = self._call_client(prompt, phases)
+            if response:
+                self.cache.put(key, response)
+        return response
+
+    def _process_test_case(self, prompt_template: str, test_case: TestCase,
+                           submitted_ns: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Run one test case against one prompt template; accuracy is scored in batches.
+
+        result['phases'] holds perf_counter_ns spans: queue_wait (executor
+        queue, when submitted_ns is given), render, call (LLM call including
+        cache lookup), plus throttle and ttft when they apply. Scoring time
+        is added per prompt by the batch scorer.
+        """
+        key = case_key(prompt_template, test_case) if self.checkpoint is not None else None
+        if key in self._completed_cases:
+            # Already paid for in the checkpointed run
+            return self._completed_cases[key]
+
+        start_ns = time.perf_counter_ns()
+        phases = {}
+        if submitted_ns is not None:
+            phases['queue_wait'] = start_ns - submitted_ns
+
+        # Render prompt with test case inputs
+        prompt = prompt_template.format(**test_case.input)
+        rendered_ns = time.perf_counter_ns()
+        phases['render'] = rendered_ns - start_ns
+
+        # Get LLM response
+        response = self._complete(prompt, phases)
+        end_ns = time.perf_counter_ns()
+        phases['call'] = end_ns - rendered_ns
+
+        # Measure latency
+        latency = (end_ns - start_ns) / 1e9
+
+        # Calculate individual metrics
+        token_count = count_tokens(prompt) + count_tokens(response)
+        success = 1 if response else 0
+
+        result = {
+            'latency': latency,
+            'token_count': token_count,
+            'success_rate': success,
+            'response': response,
+            'expected': test_case.expected_output,
+            'phases': phases
+        }
+        if self.checkpoint is not None:
+            self.checkpoint.append({'type': 'case', 'key': key, 'result': result})
+        return result
+
+    def evaluate_prompts(self, prompt_templates: List[str],
+                         test_cases: List[TestCase] = None) -> List[Dict[str, float]]:
+        """
+        Evaluate several prompt templates as one batch of work.
+
+        Every (prompt, test case) pair is submitted to the shared executor up
+        front and results are aggregated per prompt as they complete, so the
+        pool never idles at a per-prompt barrier.
+        """
         if test_cases is None:
             test_cases = self.test_suite
 
-        metrics = {
-            'accuracy': [],
-            'latency': [],
-            'token_count': [],
-            'success_rate': []
+        accumulators = self._run_batch(prompt_templates, test_cases)
+        return [accumulator.summary() for accumulator in accumulators]
+
+    def _run_batch(self, prompt_templates: List[str], test_cases: List[TestCase],
+                   keep_scores: bool = False,
+                   case_offset: int = 0) -> List[MetricAccumulator]:
+        """
+        Run every (prompt, test case) pair and aggregate per prompt.
+
+        Args:
+            keep_scores: Keep per-case accuracy keyed by case position
+            case_offset: Position of test_cases[0] within the full suite
+        """
+        if self.score_pool is not None:
+            return self._run_pipeline(prompt_templates, test_cases, keep_scores, case_offset)
+
+        accumulators = [MetricAccumulator(keep_scores) for _ in prompt_templates]
+
+        futures = {
+            self.executor.submit(self._process_test_case, template, test_case,
+                                 time.perf_counter_ns()): (index, case_offset + position)
+            for index, template in enumerate(prompt_templates)
+            for position, test_case in enumerate(test_cases)
         }
 
-        def process_test_case(test_case):
-            start_time = time.time()
+        pending = [([], [], []) for _ in prompt_templates]
 
-            # Render prompt with test case inputs
-            prompt = prompt_template.format(**test_case.input)
+        def flush(index):
+            responses, expected, case_ids = pending[index]
+            if responses:
+                start = time.perf_counter_ns()
+                accumulators[index].add_scores(self.scorer.score(responses, expected), case_ids)
+                accumulators[index].add_phase('score', (time.perf_counter_ns() - start) / len(responses),
+                                              len(responses))
+                responses.clear()
+                expected.clear()
+                case_ids.clear()
 
-            # Get LLM response
-            response = self.client.complete(prompt)
+        # Aggregate metrics as results stream in; score accuracy in chunks
+        for future in as_completed(futures):
+            result = future.result()
+            index, case_id = futures.pop(future)
+            accumulators[index].add_result(result)
+            pending[index][0].append(result['response'])
+            pending[index][1].append(result['expected'])
+            pending[index][2].append(case_id)
+            if len(pending[index][0]) >= self.score_chunk_size:
+                flush(index)
 
-            # Measure latency
-            latency = time.time() - start_time
+        for index in range(len(prompt_templates)):
+            flush(index)
 
-            # Calculate individual metrics
-            token_count = len(prompt.split()) + len(response.split())
-            success = 1 if response else 0
-            accuracy = self.calculate_accuracy(response, test_case.expected_output)
+        return accumulators
 
-            return {
-                'latency': latency,
-                'token_count': token_count,
-                'success_rate': success,
-                'accuracy': accuracy
-            }
+    def _run_pipeline(self, prompt_templates: List[str], test_cases: List[TestCase],
+                      keep_scores: bool = False,
+                      case_offset: int = 0) -> List[MetricAccumulator]:
+        """
+        _run_batch as a two-stage pipeline: LLM calls on threads, scoring on processes.
+
+        Call threads push completed results onto a bounded queue; the calling
+        thread drains it into per-prompt chunks of score_chunk_size and ships
+        each chunk to the scoring process pool, keeping at most two chunks per
+        process in flight. When scoring falls behind, the queue fills and the
+        call threads block on it, so memory stays bounded. Per-stage busy time
+        and utilization of the last run are left in self.pipeline_stats.
+        """
+        accumulators = [MetricAccumulator(keep_scores) for _ in prompt_templates]
+        results = queue.Queue(maxsize=self.pipeline_queue_size)
+        timing_lock = threading.Lock()
+        timing = {'io_busy_s': 0.0, 'io_blocked_s': 0.0}
+        abort = threading.Event()
+
+        def produce(index, case_id, template, test_case, submitted_ns):
+            start = time.perf_counter()
+            try:
+                item = (index, case_id, self._process_test_case(template, test_case, submitted_ns))
+            except BaseException as exc:
+                item = (index, case_id, exc)
+            ready = time.perf_counter()
+            while not abort.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            with timing_lock:
+                timing['io_busy_s'] += ready - start
+                timing['io_blocked_s'] += time.perf_counter() - ready
 
-        # Run test cases in parallel
-        results = list(self.executor.map(process_test_case, test_cases))
+        wall_start = time.perf_counter()
+        for index, template in enumerate(prompt_templates):
+            for position, test_case in enumerate(test_cases):
+                self.executor.submit(produce, index, case_offset + position, template, test_case,
+                                     time.perf_counter_ns())
 
-        # Aggregate metrics
-        for result in results:
-            metrics['latency'].append(result['latency'])
-            metrics['token_count'].append(result['token_count'])
-            metrics['success_rate'].append(result['success_rate'])
-            metrics['accuracy'].append(result['accuracy'])
+        pending = [([], [], []) for _ in prompt_templates]
+        in_flight = []
+        max_in_flight = 2 * self.scoring_processes
+        score_busy = 0.0
+        max_depth = 0
 
+        def collect(oldest_only):
+            nonlocal score_busy
+            while in_flight and (not oldest_only or len(in_flight) >= max_in_flight):
+                index, case_ids, future = in_flight.pop(0)
+                scores, busy = future.result()
+                score_busy += busy
+                accumulators[index].add_scores(scores, case_ids)
+                accumulators[index].add_phase('score', busy * 1e9 / len(case_ids), len(case_ids))
+
+        def flush(index):
+            responses, expected, case_ids = pending[index]
+            if responses:
+                collect(oldest_only=True)
+                future = self.score_pool.submit(_score_chunk, self.scorer_name, list(responses), list(expected),
+                                                self._scorer_generation)
+                in_flight.append((index, list(case_ids), future))
+                responses.clear()
+                expected.clear()
+                case_ids.clear()
+
+        try:
+            for _ in range(len(prompt_templates) * len(test_cases)):
+                max_depth = max(max_depth, results.qsize())
+                index, case_id, result = results.get()
+                if isinstance(result, BaseException):
+                    raise result
+                accumulators[index].add_result(result)
+                pending[index][0].append(result['response'])
+                pending[index][1].append(result['expected'])
+                pending[index][2].append(case_id)
+                if len(pending[index][0]) >= self.score_chunk_size:
+                    flush(index)
+
+            for index in range(len(prompt_templates)):
+                flush(index)
+            collect(oldest_only=False)
+        except BaseException:
+            # Release call threads blocked on the full queue
+            abort.set()
+            raise
+
+        wall = time.perf_counter() - wall_start
+        self.pipeline_stats = {
+            'wall_s': wall,
+            'io_busy_s': timing['io_busy_s'],
+            'io_blocked_s': timing['io_blocked_s'],
+            'io_utilization': timing['io_busy_s'] / (wall * self.max_workers) if wall else 0.0,
+            'score_busy_s': score_busy,
+            'score_utilization': score_busy / (wall * self.scoring_processes) if wall else 0.0,
+            'max_queue_depth': max_depth,
+        }
+        return accumulators
+
+    def evaluate_prompt(self, prompt_template: str, test_cases: List[TestCase] = None) -> Dict[str, float]:
+        """Evaluate a prompt template against test cases in parallel."""
+        return self.evaluate_prompts([prompt_template], test_cases)[0]
+
+    def screen_prompts(self, prompt_templates: List[str], min_cases: int = 8,
+                       eta: int = 2, seed: int = 0) -> Dict[str, Any]:
+        """
+        Pick the best prompt with successive halving instead of full evaluation.
+
+        All candidates are scored on a small random sample of the test suite;
+        only the top 1/eta survive to the next round, where the sample grows
+        by a factor of eta. Results from earlier rounds are reused, so each
+        survivor is only run on the newly added cases. The winner is always
+        scored on the full suite, so its metrics compare directly with a
+        fully evaluated prompt.
+
+        Returns:
+            Dict with the winning prompt, its full-suite metrics and the
+            number of LLM calls made and saved versus full evaluation
+        """
+        cases = list(self.test_suite)
+        np.random.default_rng(seed).shuffle(cases)
+
+        survivors = list(range(len(prompt_templates)))
+        totals = [MetricAccumulator() for _ in prompt_templates]
+        evaluated = 0
+        sample_size = min(min_cases, len(cases))
+        calls = 0
+
+        while True:
+            new_cases = cases[evaluated:sample_size]
+            batch = self._run_batch([prompt_templates[i] for i in survivors], new_cases)
+            for index, accumulator in zip(survivors, batch):
+                totals[index].merge(accumulator)
+            calls += len(survivors) * len(new_cases)
+            evaluated = sample_size
+
+            if evaluated >= len(cases):
+                break
+            if len(survivors) > 1:
+                survivors.sort(key=lambda i: totals[i].avg_accuracy, reverse=True)
+                survivors = survivors[:max(1, -(-len(survivors) // eta))]
+                sample_size = min(len(cases), sample_size * eta)
+            else:
+                # One survivor left: finish it on the rest of the suite
+                sample_size = len(cases)
+
+        best = max(survivors, key=lambda i: totals[i].avg_accuracy)
+        full_calls = len(prompt_templates) * len(cases)
         return {
-            'avg_accuracy': np.mean(metrics['accuracy']),
-            'avg_latency': np.mean(metrics['latency']),
-            'p95_latency': np.percentile(metrics['latency'], 95),
-            'avg_tokens': np.mean(metrics['token_count']),
-            'success_rate': np.mean(metrics['success_rate'])
+            'best_prompt': prompt_templates[best],
+            'metrics': totals[best].summary(),
+            'llm_calls': calls,
+            'llm_calls_saved': full_calls - calls,
         }
 
     def calculate_accuracy(self, response: str, expected: str) -> float:
-        """Calculate accuracy score between response and expected output."""
-        # Simple exact match
-        if response.strip().lower() == expected.strip().lower():
-            return 1.0
+        """Score a single response with the configured scorer."""
+        return float(self.scorer.score([response], [expected])[0])
 
-        # Partial match using word overlap
-        response_words = set(response.lower().split())
-        expected_words = set(expected.lower().split())
+    def optimize(self, base_prompt: str, max_iterations: int = 5,
+                 screening: Optional[str] = None,
+                 objective: str = 'accuracy',
+                 accuracy_floor: float = 0.9) -> Dict[str, Any]:
+        """
+        Iteratively optimize a prompt.
 
-        if not expected_words:
-            return 0.0
-
-        overlap = len(response_words & expected_words)
-        return overlap / len(expected_words)
+        Args:
+            base_prompt: Starting prompt template
+            max_iterations: Maximum optimization iterations
+            screening: "halving" to screen variations with successive halving
+                (see screen_prompts) instead of running each on the full suite
+            objective: "accuracy" returns the most accurate prompt; "pareto"
+                keeps the accuracy / p95 latency / token frontier of every
+                prompt evaluated and returns the cheapest, then fastest,
+                prompt on it that reaches accuracy_floor (the most accurate
+                one if none does)
+            accuracy_floor: Minimum avg_accuracy for the pareto choice
+        """
+        if objective not in ('accuracy', 'pareto'):
+            raise ValueError(f"Unknown objective '{objective}'. Available: accuracy, pareto")
 
-    def optimize(self, base_prompt: str, max_iterations: int = 5) -> Dict[str, Any]:
-        """Iteratively optimize a prompt."""
         current_prompt = base_prompt
         best_prompt = base_prompt
         best_score = 0
         current_metrics = None
+        calls_saved = 0
+        evaluated = []
+
+        if self.checkpoint_path and self.checkpoint is None:
+            resuming = bool(self._recorded_iterations or self._completed_cases)
+            self.checkpoint = CheckpointLog(self.checkpoint_path, fresh=not resuming)
+            if not resuming:
+                self.checkpoint.append({
+                    'type': 'run',
+                    'base_prompt': base_prompt,
+                    'max_iterations': max_iterations,
+                    'screening': screening,
+                    'objective': objective,
+                    'accuracy_floor': accuracy_floor
+                }, sync=True)
 
         for iteration in range(max_iterations):
             print(f"\nIteration {iteration + 1}/{max_iterations}")
@@ -119,6 +1253,9 @@ class PromptOptimizer:
                 metrics = self.evaluate_prompt(current_prompt)
 
             print(f"Accuracy: {metrics['avg_accuracy']:.2f}, Latency: {metrics['avg_latency']:.2f}s")
+            if metrics.get('phases'):
+                print("Phases (avg ms): " + ", ".join(
+                    f"{name} {phase['avg_ms']:.2f}" for name, phase in metrics['phases'].items()))
 
             # Track results
             self.results_history.append({
@@ -126,6 +1263,11 @@ class PromptOptimizer:
                 'prompt': current_prompt,
                 'metrics': metrics
             })
+            if self.checkpoint is not None and iteration not in self._recorded_iterations:
+                self._recorded_iterations.add(iteration)
+                self.checkpoint.append({'type': 'iteration', **self.results_history[-1]}, sync=True)
+
+            evaluated.append({'prompt': current_prompt, 'metrics': metrics})
 
             # Update best if improved
             if metrics['avg_accuracy'] > best_score:
@@ -145,8 +1287,18 @@ class PromptOptimizer:
             best_variation_score = metrics['avg_accuracy']
             best_variation_metrics = metrics
 
-            for variation in variations:
-                var_metrics = self.evaluate_prompt(variation)
+            if screening == 'halving':
+                screened = self.screen_prompts(variations)
+                calls_saved += screened['llm_calls_saved']
+                print(f"Screening saved {screened['llm_calls_saved']} of "
+                      f"{screened['llm_calls'] + screened['llm_calls_saved']} LLM calls")
+                candidates = [(screened['best_prompt'], screened['metrics'])]
+            else:
+                # Evaluate all variations as one batch
+                candidates = list(zip(variations, self.evaluate_prompts(variations)))
+
+            evaluated.extend({'prompt': v, 'metrics': m} for v, m in candidates)
+            for variation, var_metrics in candidates:
                 if var_metrics['avg_accuracy'] > best_variation_score:
                     best_variation_score = var_metrics['avg_accuracy']
                     best_variation = variation
@@ -155,12 +1307,63 @@ class PromptOptimizer:
             current_prompt = best_variation
             current_metrics = best_variation_metrics
 
-        return {
+        results = {
             'best_prompt': best_prompt,
             'best_score': best_score,
-            'history': self.results_history
+            'history': self.results_history,
+            'llm_calls_saved': calls_saved
         }
 
+        if objective == 'pareto':
+            frontier = pareto_frontier(evaluated)
+            eligible = [c for c in frontier if c['metrics']['avg_accuracy'] >= accuracy_floor]
+            if eligible:
+                choice = min(eligible, key=lambda c: (c['metrics']['avg_tokens'], c['metrics']['p95_latency']))
+            else:
+                print(f"No prompt reached accuracy {accuracy_floor:.2f}; returning the most accurate")
+                choice = max(frontier, key=lambda c: c['metrics']['avg_accuracy'])
+            results.update({
+                'best_prompt': choice['prompt'],
+                'best_score': choice['metrics']['avg_accuracy'],
+                'best_metrics': choice['metrics'],
+                'frontier': frontier,
+            })
+
+        return results
+
+    def resume(self, checkpoint_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Resume an interrupted optimize run from its checkpoint log.
+
+        The run is replayed with its original settings; every (prompt, case)
+        pair found in the checkpoint reuses the recorded result instead of
+        calling the LLM, so replay is fast and deterministic and only the
+        missing evaluations cost anything. New progress is appended to the
+        same checkpoint.
+        """
+        self.checkpoint_path = checkpoint_path or self.checkpoint_path
+        records = CheckpointLog.read(self.checkpoint_path)
+
+        # Logs written before fresh runs truncated them may hold several runs
+        starts = [i for i, r in enumerate(records) if r.get('type') == 'run']
+        if not starts:
+            raise ValueError(f"No run record in checkpoint {self.checkpoint_path}")
+        run = records[starts[-1]]
+
+        for record in records[starts[-1] + 1:]:
+            if record.get('type') == 'case':
+                self._completed_cases[record['key']] = record['result']
+            elif record.get('type') == 'iteration':
+                self._recorded_iterations.add(record['iteration'])
+
+        print(f"Resuming from {self.checkpoint_path}: {len(self._completed_cases)} cached evaluations, "
+              f"{len(self._recorded_iterations)} completed iterations")
+        self.results_history = []
+        # Checkpoints written before the Pareto objective existed lack these
+        return self.optimize(run['base_prompt'], run['max_iterations'], run['screening'],
+                             objective=run.get('objective', 'accuracy'),
+                             accuracy_floor=run.get('accuracy_floor', 0.9))
+
     def generate_variations(self, prompt: str, current_metrics: Dict) -> List[str]:
         """Generate prompt variations to test."""
         variations = []
@@ -209,27 +1412,108 @@ Input: Sample input
 Output: Sample output
 """
 
-    def compare_prompts(self, prompt_a: str, prompt_b: str) -> Dict[str, Any]:
-        """A/B test two prompts."""
-        print("Testing Prompt A...")
-        metrics_a = self.evaluate_prompt(prompt_a)
+    def compare_prompts(self, prompt_a: str, prompt_b: str, alpha: float = 0.05,
+                        n_resamples: int = 10000) -> Dict[str, Any]:
+        """
+        A/B test two prompts with a paired bootstrap on per-case accuracy.
+
+        The winner is only declared when the difference is significant at
+        alpha; otherwise it is reported as 'tie'.
+        """
+        print("Testing Prompts A and B...")
+        acc_a, acc_b = self._run_batch([prompt_a, prompt_b], self.test_suite, keep_scores=True)
+        metrics_a, metrics_b = acc_a.summary(), acc_b.summary()
+
+        case_ids = sorted(acc_a.scores)
+        significance = paired_bootstrap(
+            np.fromiter((acc_a.scores[i] for i in case_ids), dtype=float, count=len(case_ids)),
+            np.fromiter((acc_b.scores[i] for i in case_ids), dtype=float, count=len(case_ids)),
+            n_resamples=n_resamples
+        )
 
-        print("Testing Prompt B...")
-        metrics_b = self.evaluate_prompt(prompt_b)
+        if significance['p_value'] >= alpha:
+            winner = 'tie'
+        else:
+            winner = 'A' if significance['mean_difference'] > 0 else 'B'
 
         return {
             'prompt_a_metrics': metrics_a,
             'prompt_b_metrics': metrics_b,
-            'winner': 'A' if metrics_a['avg_accuracy'] > metrics_b['avg_accuracy'] else 'B',
-            'improvement': abs(metrics_a['avg_accuracy'] - metrics_b['avg_accuracy'])
+            'winner': winner,
+            'improvement': abs(metrics_a['avg_accuracy'] - metrics_b['avg_accuracy']),
+            **significance
         }
 
     def export_results(self, filename: str):
-        """Export optimization results to JSON."""
+        """Export optimization results (metrics and per-phase timings per iteration) to JSON."""
         with open(filename, 'w') as f:
             json.dump(self.results_history, f, indent=2)
 
 
+def _evaluate_shard(prompt_templates: List[str], suite_path: str, shard: int, num_shards: int,
+                    client_factory: Callable[[], Any], threads_per_shard: int,
+                    batch_size: int, optimizer_kwargs: Dict[str, Any]) -> List[MetricAccumulator]:
+    """Worker process: evaluate one shard of a JSONL suite in bounded batches."""
+    optimizer = PromptOptimizer(client_factory(), [], max_workers=threads_per_shard, **optimizer_kwargs)
+    totals = [MetricAccumulator() for _ in prompt_templates]
+    try:
+        cases = iter_test_cases(suite_path, shard, num_shards)
+        while True:
+            batch = [case for _, case in zip(range(batch_size), cases)]
+            if not batch:
+                break
+            # Scorer caches hold every text they have seen: start each batch afresh
+            optimizer._reset_scorer()
+            for total, accumulator in zip(totals, optimizer._run_batch(prompt_templates, batch)):
+                total.merge(accumulator)
+    finally:
+        optimizer.shutdown()
+    return totals
+
+
+def evaluate_suite_sharded(prompt_templates: List[str], suite_path: str,
+                           client_factory: Callable[[], Any],
+                           num_shards: Optional[int] = None,
+                           threads_per_shard: int = 8,
+                           batch_size: int = 1000,
+                           **optimizer_kwargs) -> List[Dict[str, float]]:
+    """
+    Evaluate prompts over a JSONL suite split across worker processes.
+
+    Each worker streams its shard of the file, runs it through its own
+    PromptOptimizer (own thread pool, own client from client_factory) in
+    batches of batch_size, and returns mergeable accumulators. The scorer's
+    vocabulary and cached encodings are rebuilt for every batch, so memory
+    stays bounded by the batch size no matter how large the suite is.
+
+    Args:
+        prompt_templates: Prompts to evaluate
+        suite_path: JSONL test suite (see iter_test_cases)
+        client_factory: Picklable callable returning a fresh LLM client
+        num_shards: Worker processes (defaults to the CPU count)
+        threads_per_shard: LLM call threads per worker
+        batch_size: Test cases in flight per worker
+        optimizer_kwargs: Extra PromptOptimizer arguments (scorer, ...)
+
+    Returns:
+        One metrics summary per prompt template
+    """
+    num_shards = num_shards or os.cpu_count() or 1
+    totals = [MetricAccumulator() for _ in prompt_templates]
+
+    with ProcessPoolExecutor(max_workers=num_shards) as pool:
+        futures = [
+            pool.submit(_evaluate_shard, prompt_templates, suite_path, shard, num_shards,
+                        client_factory, threads_per_shard, batch_size, optimizer_kwargs)
+            for shard in range(num_shards)
+        ]
+        for future in as_completed(futures):
+            for total, accumulator in zip(totals, future.result()):
+                total.merge(accumulator)
+
+    return [total.summary() for total in totals]
+
+
 def main():
     # Example usage
     test_suite = [
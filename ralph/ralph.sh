@@ -1,17 +1,67 @@
 #!/bin/bash
 # Ralph - Universal AI Agent Loop
 # Works with: amp, opencode, claude
-# Usage: ./ralph.sh [max_iterations]
+# Usage: ./ralph.sh [max_iterations] [--parallel N] | --check
 
 set -e
 
-MAX_ITERATIONS=${1:-10}
+MAX_ITERATIONS=10
+PARALLEL=${RALPH_PARALLEL:-1}
+CHECK_ONLY=0
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PRD_FILE="prd.json"
 PROGRESS_FILE="progress.txt"
 ARCHIVE_DIR="archive"
 LAST_BRANCH_FILE=".last-branch"
 PROMPT_FILE="$SCRIPT_DIR/prompt.md"
+STATE_DIR=".ralph"
+WORKTREE_DIR="$STATE_DIR/worktrees"
+LOG_DIR="$STATE_DIR/logs"
+METRICS_FILE="$STATE_DIR/metrics.jsonl"
+RUN_ID=$(date +%Y%m%d-%H%M%S)
+COMPLETE_MARKER="<promise>COMPLETE</promise>"
+# Extended regexes matched against each output line (empty: disabled)
+FAILURE_MARKERS=${RALPH_FAILURE_MARKERS:-}  # End the iteration early
+ABORT_MARKERS=${RALPH_ABORT_MARKERS:-}      # End the whole run
+# Acceptance check commands, one per line (default: prd.json "checks")
+CHECKS=${RALPH_CHECKS:-}
+# Days a cached passing check result survives without being reused
+CHECK_CACHE_DAYS=${RALPH_CHECK_CACHE_DAYS:-7}
+
+usage() {
+  echo "Usage: $0 [max_iterations] [--parallel N]"
+  echo "       $0 --check"
+  echo ""
+  echo "  max_iterations    Iterations (rounds in parallel mode) before giving up (default: 10)"
+  echo "  -j, --parallel N  Run up to N stories at once, each in its own git worktree"
+  echo "                    (default: \$RALPH_PARALLEL or 1)"
+  echo "  --check           Run the acceptance checks on the working tree and exit,"
+  echo "                    reusing cached results for an unchanged tree"
+  echo ""
+  echo "Environment:"
+  echo "  RALPH_FAILURE_MARKERS  Regex; an output line matching it ends the iteration"
+  echo "  RALPH_ABORT_MARKERS    Regex; an output line matching it ends the run"
+  echo "  RALPH_CHECKS           Check commands, one per line (default: prd.json \"checks\")"
+  echo "  RALPH_CHECK_CACHE_DAYS Drop cached check passes unused for this many days (default: 7)"
+}
+
+while [ $# -gt 0 ]; do
+  case "$1" in
+    -j|--parallel)
+      [ $# -ge 2 ] || { usage; exit 1; }
+      PARALLEL="$2"; shift 2 ;;
+    --check) CHECK_ONLY=1; shift ;;
+    -h|--help) usage; exit 0 ;;
+    *) MAX_ITERATIONS="$1"; shift ;;
+  esac
+done
+
+# Also guards $RALPH_PARALLEL, which reaches the same arithmetic tests
+if ! [[ "$PARALLEL" =~ ^[1-9][0-9]*$ ]]; then
+  echo "Invalid --parallel value: '$PARALLEL' (expected a positive integer)" >&2
+  usage
+  exit 1
+fi
 
 # Colors
 RED='\033[0;31m'
@@ -124,8 +174,511 @@ init_progress() {
   fi
 }
 
+# Keep ralph's working state out of git status
+ignore_state_dir() {
+  local exclude
+  exclude=$(git rev-parse --git-path info/exclude)
+  mkdir -p "$(dirname "$exclude")"
+  grep -qxF "$STATE_DIR/" "$exclude" 2>/dev/null || echo "$STATE_DIR/" >> "$exclude"
+}
+
+# Shared jq definitions for the dependsOn DAG of pending stories
+JQ_DAG='
+  def pending: [.userStories[] | select(.passes != true)];
+  def done_ids: [.userStories[] | select(.passes == true) | .id];
+  def deps: (.dependsOn // []);
+  # Kahn peel: repeatedly take the stories whose pending dependencies are all
+  # taken. .order is topological; stories on or behind a cycle stay in .rest
+  def topo($p):
+    ($p | map({key: .id, value: true}) | from_entries) as $pend
+    | {order: [], taken: {}, rest: $p, done: ($p | length == 0)}
+    | until(.done;
+        . as $s
+        | [$s.rest[] | select(all(deps[]; ($pend[.] | not) or $s.taken[.]))] as $ready
+        | if ($ready | length) == 0 then .done = true
+          else .order += $ready
+            | .taken += ($ready | map({key: .id, value: true}) | from_entries)
+            | .rest -= $ready
+            | .done = (.rest | length == 0)
+          end);
+  # Longest chain of pending stories waiting on each story, itself included,
+  # in one pass over the stories in reverse topological order
+  def chains($order):
+    (reduce $order[] as $s ({}; reduce ($s | deps[]) as $d (.; .[$d] += [$s.id]))) as $waiting
+    | reduce ($order | reverse[]) as $s ({};
+        .[$s.id] = 1 + ([.[($waiting[$s.id] // [])[]]] | max // 0));
+'
+
+# Fail fast on dependsOn entries naming unknown stories or forming a cycle
+check_dependencies() {
+  local problems
+  problems=$(jq -r "$JQ_DAG"'
+    (.userStories | map({key: .id, value: true}) | from_entries) as $ids
+    | pending as $p
+    | ($p[] | deps[] | select($ids[.] | not) | "unknown story \(.)"),
+      (topo($p).rest | select(length > 0)
+        | "dependency cycle involving \(map(.id) | join(", "))")
+  ' "$PRD_FILE" 2>&1) || true
+  if [ -n "$problems" ]; then
+    error "Invalid dependsOn in $PRD_FILE: $(echo $problems)"
+  fi
+}
+
+# Pending stories whose dependsOn stories all pass, critical path first:
+# stories with the longest chain of pending stories waiting on them go
+# first, then by priority, so the total number of iterations is minimal
+ready_stories() {
+  jq -r "$JQ_DAG"'
+    done_ids as $done
+    | pending as $p
+    | chains(topo($p).order) as $chain
+    | [$p[] | select((deps - $done) | length == 0) | {id, priority, chain: ($chain[.id] // 1)}]
+    | sort_by(-.chain, .priority) | .[].id
+  ' "$PRD_FILE"
+}
+
+# Prompt for a sequential iteration: prompt.md plus the scheduled story
+write_iteration_prompt() {
+  local id="$1" out="$2"
+  cat "$PROMPT_FILE" > "$out"
+  cat >> "$out" <<EOF
+
+## Assigned Story
+
+The loop scheduled story \`$id\` for this iteration: all of its \`dependsOn\`
+stories already pass. Implement this story in step 4 instead of choosing one.
+EOF
+}
+
+passing_stories() {
+  jq -r '.userStories[] | select(.passes == true) | .id' "$PRD_FILE" | sort
+}
+
+mark_passed() {
+  local id="$1"
+  local tmp="$PRD_FILE.tmp.$$"
+  jq --arg id "$id" '(.userStories[] | select(.id == $id) | .passes) = true' "$PRD_FILE" > "$tmp"
+  mv "$tmp" "$PRD_FILE"
+}
+
+# Prompt for one story in its worktree: prompt.md plus the story assignment
+write_story_prompt() {
+  local id="$1" branch="$2" out="$3"
+  cat "$PROMPT_FILE" > "$out"
+  cat >> "$out" <<EOF
+
+## Assigned Story (Parallel Mode)
+
+You are running in a dedicated git worktree on branch \`$branch\`, alongside
+other agents working on other stories. This overrides steps 1-4, 9 and 10:
+
+- Implement ONLY this story:
+\`\`\`json
+$(jq --arg id "$id" '.userStories[] | select(.id == $id)' "$PRD_FILE")
+\`\`\`
+- Read the Codebase Patterns in \`$(pwd)/$PROGRESS_FILE\`, but do not edit it.
+- Commit on the current branch. Do NOT switch branches or edit \`$PRD_FILE\`.
+- Write your progress report (format above) to \`$STATE_DIR/progress-entry.md\`
+  in this worktree instead of appending to \`$PROGRESS_FILE\`.
+- Do not reply with <promise>COMPLETE</promise>; the loop tracks completion.
+EOF
+}
+
+# Check commands come from $RALPH_CHECKS or prd.json "checks". Export them
+# so an agent running --check (also from a worktree) uses the same list.
+load_checks() {
+  if [ -z "$CHECKS" ] && [ -f "$PRD_FILE" ]; then
+    CHECKS=$(jq -r '(.checks // [])[]' "$PRD_FILE")
+  fi
+  export RALPH_CHECKS="$CHECKS"
+}
+
+# Hash of the working tree as it would be committed, including uncommitted
+# and untracked files, computed in a scratch index. Ralph's own bookkeeping
+# files are left out so updating them does not invalidate cached checks.
+tree_hash() {
+  local index
+  index=$(mktemp)
+  cp "$(git rev-parse --git-path index)" "$index" 2>/dev/null || rm -f "$index"
+  (
+    export GIT_INDEX_FILE="$index"
+    git add -A :/ > /dev/null 2>&1 &&
+      git rm -r -q --cached --ignore-unmatch -- \
+        ":/$PRD_FILE" ":/$PROGRESS_FILE" ":/$LAST_BRANCH_FILE" ":/$ARCHIVE_DIR" ":/$STATE_DIR" > /dev/null 2>&1 &&
+      git write-tree
+  )
+  local rc=$?
+  rm -f "$index"
+  return $rc
+}
+
+# Check results live in the common git dir so every worktree shares them
+check_cache_dir() {
+  echo "$(cd "$(git rev-parse --git-common-dir)" && pwd)/ralph-checks"
+}
+
+# Run each check command against the working tree, reusing a cached pass
+# for a tree and command that already passed (failures always rerun).
+# Prints a markdown report; returns 1 if any check fails.
+run_checks() {
+  local tree cache
+  tree=$(tree_hash) || { warn "Could not hash the working tree; checks skipped"; return 1; }
+  cache=$(check_cache_dir)
+  mkdir -p "$cache"
+  find "$cache" -type f -mtime "+$CHECK_CACHE_DAYS" -delete 2>/dev/null || true
+
+  local failed=0 cmd
+  echo "Tree \`${tree:0:12}\`:"
+  while IFS= read -r cmd; do
+    [ -n "$cmd" ] || continue
+    local key entry how=cached status=pass out=""
+    key=$(printf '%s\n%s\n' "$tree" "$cmd" | git hash-object --stdin)
+    entry="$cache/$key"
+    if [ "$(head -n 1 "$entry" 2>/dev/null)" = pass ]; then
+      touch "$entry"  # Still in use: keep it from being pruned
+    else
+      local start
+      start=$(date +%s)
+      out=$(bash -c "$cmd" < /dev/null 2>&1) || status=fail
+      how="ran in $(($(date +%s) - start))s"
+      # Only passes are cached: a failure may be flaky or caused by the
+      # environment, so it is always rerun
+      if [ "$status" = pass ]; then
+        echo pass > "$entry.tmp.$$"
+        mv "$entry.tmp.$$" "$entry"
+      else
+        rm -f "$entry"
+      fi
+    fi
+
+    if [ "$status" = pass ]; then
+      echo "- PASS \`$cmd\` ($how)"
+    else
+      failed=1
+      echo "- FAIL \`$cmd\` ($how)"
+      if [ -n "$out" ]; then
+        echo '  ```'
+        printf '%s\n' "$out" | tail -n 40 | sed 's/^/  /'
+        echo '  ```'
+      fi
+    fi
+  done <<< "$CHECKS"
+  return $failed
+}
+
+# Append the check report for the current tree to an iteration prompt
+write_checks_prompt() {
+  local out="$1"
+  [ -n "$CHECKS" ] || return 0
+
+  info "Running acceptance checks (cached by tree)"
+  local report start
+  start=$(date +%s)
+  report=$(run_checks) || true
+  ITER_CHECKS_S=$(($(date +%s) - start))
+  echo "$report"
+  cat >> "$out" <<EOF
+
+## Acceptance Checks
+
+The loop runs the project's checks itself and caches each pass by git tree
+hash, so a check that passed on an unchanged tree is never run again.
+Failures are always rerun. Results for the tree at the start of this
+iteration:
+
+$report
+
+For the quality checks in step 6, run \`bash $SCRIPT_DIR/$(basename "$0") --check\`
+instead of invoking these commands yourself: it checks the current working
+tree, reusing cached results, and exits non-zero if any check fails. Run
+other story-specific checks as usual.
+EOF
+}
+
+# Rebase a finished story onto the base branch and fast-forward it in.
+# Stories without commits or with conflicts stay pending for the next round.
+merge_story() {
+  local id="$1" base="$2"
+  local wt="$WORKTREE_DIR/$id"
+  local branch="ralph/wt/$id"
+  local entry="$wt/$STATE_DIR/progress-entry.md"
+
+  if [ "$(git rev-list --count "$base..$branch" 2>/dev/null || echo 0)" -eq 0 ]; then
+    warn "$id: no commits produced; re-queued"
+  else
+    git -C "$wt" reset -q --hard
+    if git -C "$wt" rebase -q "$base" > /dev/null 2>&1 && git merge -q --ff-only "$branch" > /dev/null 2>&1; then
+      mark_passed "$id"
+      [ -f "$entry" ] && cat "$entry" >> "$PROGRESS_FILE"
+      success "$id: merged into $base"
+    else
+      git -C "$wt" rebase --abort > /dev/null 2>&1 || true
+      warn "$id: conflicts with $base; re-queued"
+      printf '## %s - %s\n- Merge conflict in parallel mode; re-queued on the updated branch\n---\n' \
+        "$(date)" "$id" >> "$PROGRESS_FILE"
+    fi
+  fi
+
+  git worktree remove --force "$wt" > /dev/null 2>&1 || true
+  git branch -q -D "$branch" > /dev/null 2>&1 || true
+}
+
+# Snapshot state at the start of an iteration for record_iteration
+begin_iteration() {
+  ITER_START=$(date +%s)
+  ITER_START_ISO=$(date -u +%Y-%m-%dT%H:%M:%SZ)
+  ITER_HEAD=$(git rev-parse -q --verify HEAD 2>/dev/null || true)
+  ITER_PASSING=$(passing_stories)
+  ITER_CHECKS_S=0
+}
+
+# Append one iteration's metrics to $METRICS_FILE
+# Usage: record_iteration <iteration> <status> [log files...]
+record_iteration() {
+  local n="$1" status="$2"
+  shift 2
+  local end
+  end=$(date +%s)
+
+  local bytes=0
+  for f in "$@"; do
+    [ -f "$f" ] && bytes=$((bytes + $(wc -c < "$f")))
+  done
+
+  local completed commits
+  completed=$(comm -13 <(echo "$ITER_PASSING") <(passing_stories))
+  if [ -n "$ITER_HEAD" ]; then
+    commits=$(git log --format='%h %s' "$ITER_HEAD..HEAD" 2>/dev/null || true)
+  else
+    commits=$(git log --format='%h %s' 2>/dev/null || true)
+  fi
+
+  mkdir -p "$STATE_DIR"
+  jq -n -c \
+    --arg run "$RUN_ID" \
+    --argjson iteration "$n" \
+    --arg cli "$(detect_cli)" \
+    --argjson parallel "$PARALLEL" \
+    --arg start "$ITER_START_ISO" \
+    --arg finish "$(date -u +%Y-%m-%dT%H:%M:%SZ)" \
+    --argjson duration "$((end - ITER_START))" \
+    --argjson checks "${ITER_CHECKS_S:-0}" \
+    --argjson bytes "$bytes" \
+    --arg status "$status" \
+    --arg completed "$completed" \
+    --arg commits "$commits" \
+    '{run: $run, iteration: $iteration, cli: $cli, parallel: $parallel,
+      start: $start, "end": $finish, duration_s: $duration, checks_s: $checks,
+      output_bytes: $bytes,
+      status: $status,
+      stories_completed: ($completed | split("\n") | map(select(length > 0))),
+      commits: ($commits | split("\n") | map(select(length > 0)))}' >> "$METRICS_FILE"
+}
+
+# Print a summary of this run's iterations (EXIT trap)
+report_run() {
+  [ -f "$METRICS_FILE" ] || return 0
+  jq -s -r --arg run "$RUN_ID" '
+    def dur: if . >= 3600 then "\(. / 3600 | floor)h\(. % 3600 / 60 | floor)m"
+             elif . >= 60 then "\(. / 60 | floor)m\(. % 60)s" else "\(.)s" end;
+    map(select(.run == $run)) as $its
+    | select($its | length > 0)
+    | ($its | map(.duration_s) | add) as $wall
+    | ($its | map(.stories_completed | length) | add) as $stories
+    | ($its | map(.commits | length) | add) as $commits
+    | ($its | map(select((.stories_completed | length) == 0 and (.commits | length) == 0))) as $stalled
+    | ($its | max_by(.duration_s)) as $slowest
+    | "",
+      "Run summary (\($its[0].cli), \($its | length) iterations)",
+      "  Wall time:        \($wall | dur)",
+      "  In checks:        \($its | map(.checks_s // 0) | add | dur)",
+      "  Stories done:     \($stories)",
+      "  Commits:          \($commits)",
+      "  Throughput:       \(if $wall > 0 then ($stories * 3600 / $wall * 10 | round / 10) else 0 end) stories/hour",
+      "  Time per story:   \(if $stories > 0 then ($wall / $stories | floor | dur) else "n/a" end)",
+      "  Avg iteration:    \($wall / ($its | length) | floor | dur)",
+      "  Slowest:          #\($slowest.iteration) (\($slowest.duration_s | dur))",
+      "  No progress:      \(if ($stalled | length) > 0 then ($stalled | map("#\(.iteration)") | join(", ")) else "none" end)",
+      "",
+      ($its[] | "  #\(.iteration) \(.duration_s | dur) \(.status) stories=[\(.stories_completed | join(","))] commits=\(.commits | length) output=\(.output_bytes)B")
+  ' "$METRICS_FILE" || true
+  echo "  Metrics: $METRICS_FILE"
+}
+
+# Exit successfully once no pending story is ready to run. $1 rounds have
+# finished so far.
+finish_if_done() {
+  [ -z "$(ready_stories)" ] || return 0
+  # Nothing ready: fail if pending stories are blocked by a broken dependsOn
+  check_dependencies
+  echo ""
+  success "Ralph completed all tasks!"
+  echo "Completed after $1 of $MAX_ITERATIONS rounds"
+  exit 0
+}
+
+# Parallel mode: each round runs up to $PARALLEL pending stories in their own
+# worktrees, then merges finished branches back in priority order
+run_parallel() {
+  local base
+  base=$(jq -r '.branchName // empty' "$PRD_FILE")
+  if [ -z "$base" ]; then
+    base=$(git rev-parse --abbrev-ref HEAD)
+  elif [ "$(git rev-parse --abbrev-ref HEAD)" != "$base" ]; then
+    git checkout -q "$base" 2>/dev/null || git checkout -q -b "$base"
+  fi
+
+  ignore_state_dir
+  mkdir -p "$WORKTREE_DIR" "$LOG_DIR"
+  git worktree prune
+
+  finish_if_done 0
+  for round in $(seq 1 $MAX_ITERATIONS); do
+    local stories
+    stories=$(ready_stories | head -n "$PARALLEL")
+
+    echo ""
+    echo "═══════════════════════════════════════════════════════"
+    echo "  Ralph Round $round of $MAX_ITERATIONS: $(echo $stories)"
+    echo "═══════════════════════════════════════════════════════"
+
+    begin_iteration
+    local checks="$STATE_DIR/checks-prompt.md"
+    : > "$checks"
+    write_checks_prompt "$checks"
+
+    local pids=()
+    local logs=()
+    local statuses=()
+    for id in $stories; do
+      local wt="$WORKTREE_DIR/$id"
+      local branch="ralph/wt/$id"
+      git worktree remove --force "$wt" > /dev/null 2>&1 || true
+      git branch -q -D "$branch" > /dev/null 2>&1 || true
+      git worktree add -q -b "$branch" "$wt" "$base"
+      mkdir -p "$wt/$STATE_DIR"
+      write_story_prompt "$id" "$branch" "$wt/$STATE_DIR/prompt.md"
+      cat "$checks" >> "$wt/$STATE_DIR/prompt.md"
+
+      local log="$LOG_DIR/$RUN_ID-round-$round-$id.log"
+      local status_file="$STATE_DIR/status-$id"
+      info "$id: started in $wt (log: $log)"
+      rm -f "$status_file"
+      (
+        log="$(pwd)/$log" status_file="$(pwd)/$status_file"
+        cd "$wt"
+        stream_iteration "$STATE_DIR/prompt.md" "$log" quiet
+        echo "$ITERATION_STATUS" > "$status_file"
+      ) &
+      pids+=($!)
+      logs+=("$log")
+      statuses+=("$status_file")
+    done
+
+    # An agent stopped by a signal runs its trap, which stops its CLI too
+    trap 'kill -TERM "${pids[@]}" 2>/dev/null; exit 130' INT TERM
+    local aborted=""
+    while :; do
+      aborted=$(grep -lx aborted "${statuses[@]}" 2>/dev/null | head -n 1) || true
+      [ -z "$aborted" ] || break
+      local running=0 pid
+      for pid in "${pids[@]}"; do
+        ! kill -0 "$pid" 2>/dev/null || running=1
+      done
+      [ "$running" = 1 ] || break
+      sleep 1
+    done
+    if [ -n "$aborted" ]; then
+      kill -TERM "${pids[@]}" 2>/dev/null || true
+    fi
+    for pid in "${pids[@]}"; do
+      wait "$pid" || true
+    done
+    trap - INT TERM
+
+    if [ -n "$aborted" ]; then
+      record_iteration "$round" aborted "${logs[@]}"
+      echo ""
+      warn "Abort marker seen by ${aborted##*/status-} in round $round; stopped all agents. Output: ${logs[*]}"
+      exit 1
+    fi
+    local i
+    for i in "${!statuses[@]}"; do
+      if grep -qx failed "${statuses[$i]}" 2>/dev/null; then
+        warn "Failure marker seen; ended ${statuses[$i]##*/status-} early. Output: ${logs[$i]}"
+      fi
+    done
+
+    for id in $stories; do
+      merge_story "$id" "$base"
+    done
+    record_iteration "$round" done "${logs[@]}"
+    # Stop as soon as the last stories merge, even in the final round
+    finish_if_done "$round"
+  done
+
+  echo ""
+  warn "Ralph reached max rounds ($MAX_ITERATIONS) without completing all tasks."
+  echo "Check $PROGRESS_FILE for status."
+  exit 1
+}
+
+# Stop a backgrounded run_ai along with the CLI and everything it spawned
+stop_ai() {
+  local pid="$1"
+  kill -TERM -- "-$pid" 2>/dev/null || kill -TERM "$pid" 2>/dev/null || true
+}
+
+# Run one iteration, echoing output live (unless $3 is "quiet", as for
+# parallel agents) and teeing it to a log while scanning each line for
+# markers. Sets ITERATION_STATUS to complete, failed, aborted or done; on a
+# marker the CLI is stopped immediately.
+stream_iteration() {
+  local prompt="$1" log="$2" mode="${3:-}"
+  local fifo="$STATE_DIR/stream.$$"
+  rm -f "$fifo"
+  mkfifo "$fifo"
+
+  # Job control gives the CLI its own process group, so stop_ai can end it whole
+  set -m
+  run_ai "$prompt" > "$fifo" 2>&1 &
+  local pid=$!
+  set +m
+  # Its own group no longer gets the terminal's Ctrl-C: forward it
+  trap 'stop_ai "$pid"; rm -f "$fifo"; exit 130' INT TERM
+
+  ITERATION_STATUS=done
+  local line
+  while IFS= read -r line || [ -n "$line" ]; do
+    [ "$mode" = quiet ] || printf '%s\n' "$line"
+    printf '%s\n' "$line" >&3
+    if [[ "$line" == *"$COMPLETE_MARKER"* ]]; then
+      ITERATION_STATUS=complete
+    elif [ -n "$ABORT_MARKERS" ] && [[ "$line" =~ $ABORT_MARKERS ]]; then
+      ITERATION_STATUS=aborted
+    elif [ -n "$FAILURE_MARKERS" ] && [[ "$line" =~ $FAILURE_MARKERS ]]; then
+      ITERATION_STATUS=failed
+    else
+      continue
+    fi
+    stop_ai "$pid"
+    break
+  done < "$fifo" 3> "$log"
+
+  wait "$pid" 2>/dev/null || true
+  trap - INT TERM
+  rm -f "$fifo"
+}
+
 # Main loop
 main() {
+  if [ "$CHECK_ONLY" = 1 ]; then
+    load_checks
+    [ -n "$CHECKS" ] || error "No checks configured: set RALPH_CHECKS or \"checks\" in $PRD_FILE"
+    if run_checks; then exit 0; fi
+    exit 1
+  fi
+
   echo ""
   echo -e "${BLUE}╔══════════════════════════════════════╗${NC}"
   echo -e "${BLUE}║         Ralph - AI Agent Loop        ║${NC}"
@@ -136,34 +689,69 @@ main() {
   check_prereqs
   archive_previous
   init_progress
+  check_dependencies
+  load_checks
+  trap report_run EXIT
   
   info "Starting Ralph - Max iterations: $MAX_ITERATIONS"
   info "PRD: $PRD_FILE"
   info "Progress: $PROGRESS_FILE"
   echo ""
 
+  if [ "$PARALLEL" -gt 1 ]; then
+    info "Parallel mode: up to $PARALLEL stories per round"
+    run_parallel
+  fi
+
+  ignore_state_dir 2>/dev/null || true
+  mkdir -p "$LOG_DIR"
+
   for i in $(seq 1 $MAX_ITERATIONS); do
     echo ""
     echo "═══════════════════════════════════════════════════════"
     echo "  Ralph Iteration $i of $MAX_ITERATIONS"
     echo "═══════════════════════════════════════════════════════"
-    
-    # Run AI with the ralph prompt
-    OUTPUT=$(run_ai "$PROMPT_FILE") || true
-    
-    # Echo output for visibility
-    echo "$OUTPUT"
-    
-    # Check for completion signal
-    if echo "$OUTPUT" | grep -q "<promise>COMPLETE</promise>"; then
+
+    # Schedule the next story whose dependencies all pass
+    local story
+    story=$(ready_stories | head -n 1)
+    if [ -z "$story" ]; then
+      # Nothing ready: fail if pending stories are blocked by a broken dependsOn
+      check_dependencies
       echo ""
       success "Ralph completed all tasks!"
-      echo "Completed at iteration $i of $MAX_ITERATIONS"
+      echo "Completed after $((i - 1)) of $MAX_ITERATIONS iterations"
       exit 0
     fi
-    
-    info "Iteration $i complete. Continuing..."
-    sleep 2
+    info "Scheduled story: $story"
+    begin_iteration
+    write_iteration_prompt "$story" "$STATE_DIR/prompt.md"
+    write_checks_prompt "$STATE_DIR/prompt.md"
+
+    # Run AI with the ralph prompt, streaming its output
+    local log="$LOG_DIR/$RUN_ID-iteration-$i.log"
+    stream_iteration "$STATE_DIR/prompt.md" "$log"
+    record_iteration "$i" "$ITERATION_STATUS" "$log"
+
+    case "$ITERATION_STATUS" in
+      complete)
+        echo ""
+        success "Ralph completed all tasks!"
+        echo "Completed at iteration $i of $MAX_ITERATIONS"
+        exit 0
+        ;;
+      aborted)
+        echo ""
+        warn "Abort marker seen in iteration $i; stopping. Output: $log"
+        exit 1
+        ;;
+      failed)
+        warn "Failure marker seen; ended iteration $i early. Output: $log"
+        ;;
+      *)
+        info "Iteration $i complete. Output: $log"
+        ;;
+    esac
   done
 
   echo ""